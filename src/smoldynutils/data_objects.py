@@ -1,8 +1,37 @@
+import functools
+import threading
 import warnings
-from dataclasses import dataclass
-from typing import Iterator, Optional, Sequence, Type, Union, overload
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Iterator, Optional, Sequence, Type, Union, cast, overload
 
 import numpy as np
+import numpy.typing as npt
+
+from smoldynutils.metrics_numba import (
+    has_jumps,
+    sq_displacement_from_start,
+    supports_dtypes,
+    unwrap_periodic,
+    unwrap_periodic_rows,
+)
+from smoldynutils.utils import array_digest
+
+JUMP_SENSITIVITY = 0.5
+
+
+def _user_format_warning(
+    message: Warning | str,
+    category: Type[Warning],
+    filename: str,
+    lineno: int,
+    line: Optional[str] = None,
+) -> str:
+    return f"Warning: {message}\n"
+
+
+def _warn_jump(serialnumber: int) -> None:
+    warnings.formatwarning = _user_format_warning
+    warnings.warn(f"Large jumps in trajectory {serialnumber} detected.", UserWarning)
 
 
 @dataclass(frozen=True, slots=True)
@@ -14,9 +43,17 @@ class Trajectory:
     x: np.ndarray
     y: np.ndarray
     species: np.ndarray
+    _digest: Optional[bytes] = field(default=None, init=False, repr=False, compare=False)
+    _sq_displacement: Optional[np.ndarray] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _pos: Optional[np.ndarray] = field(default=None, init=False, repr=False, compare=False)
 
     def __post_init__(self) -> None:
-        """Performs sensibility checks.
+        """Performs sensibility checks and stores read-only copies of t, x, y, and species.
+
+        The copies keep the cached digest, positions, and squared displacements valid if the
+        caller changes the passed arrays afterwards.
 
         Raises:
             ValueError: Differing lenghts of t, x, y, or species
@@ -30,28 +67,121 @@ class Trajectory:
             raise ValueError("t, x, y, species must be 1D arrays")
         if not np.issubdtype(self.species.dtype, np.integer):
             raise TypeError("Species must be integer-coded")
+        for name in ("t", "x", "y", "species"):
+            array = np.array(getattr(self, name), copy=True)
+            array.flags.writeable = False
+            object.__setattr__(self, name, array)
         self._check_jumps(self.x)
         self._check_jumps(self.y)
 
+    @classmethod
+    def from_arrays(
+        cls,
+        serialnumber: int,
+        t: npt.ArrayLike,
+        x: npt.ArrayLike,
+        y: npt.ArrayLike,
+        species: npt.ArrayLike,
+        dtype: npt.DTypeLike = np.float64,
+    ) -> "Trajectory":
+        """Create Trajectory from array-likes, casting t, x, and y once.
+
+        Args:
+            serialnumber (int): Serialnumber of the trajectory
+            t (npt.ArrayLike): Timepoints
+            x (npt.ArrayLike): x values
+            y (npt.ArrayLike): y values
+            species (npt.ArrayLike): Integer-coded species
+            dtype (npt.DTypeLike, optional): dtype of t, x, and y. np.float32 halves memory
+                use and is usually precise enough for positions. Defaults to np.float64.
+
+        Returns:
+            Trajectory: Trajectory holding the converted arrays
+        """
+        return cls(
+            serialnumber,
+            t=np.asarray(t, dtype=dtype),
+            x=np.asarray(x, dtype=dtype),
+            y=np.asarray(y, dtype=dtype),
+            species=np.asarray(species),
+        )
+
+    @classmethod
+    def _from_validated(
+        cls, serialnumber: int, t: np.ndarray, xy: np.ndarray, species: np.ndarray
+    ) -> "Trajectory":
+        """Creates Trajectory from already validated arrays, skipping `__post_init__`.
+
+        x and y become the columns of `xy`, which is kept as `pos`. All arrays are stored as
+        read-only views, no data is copied.
+        """
+        xy = _readonly(xy)
+        traj = object.__new__(cls)
+        object.__setattr__(traj, "serialnumber", serialnumber)
+        object.__setattr__(traj, "t", _readonly(t))
+        object.__setattr__(traj, "x", xy[:, 0])
+        object.__setattr__(traj, "y", xy[:, 1])
+        object.__setattr__(traj, "species", _readonly(species))
+        object.__setattr__(traj, "_digest", None)
+        object.__setattr__(traj, "_sq_displacement", None)
+        object.__setattr__(traj, "_pos", xy)
+        return traj
+
+    @property
+    def digest(self) -> bytes:
+        """Fingerprint of the trajectory data, computed on first access.
+
+        Returns:
+            bytes: BLAKE2b digest of dtype, shape, and content of t, x, y, and species
+        """
+        if self._digest is None:
+            digest = array_digest(self.t, self.x, self.y, self.species)
+            object.__setattr__(self, "_digest", digest)
+        return cast(bytes, self._digest)
+
+    @property
+    def pos(self) -> np.ndarray:
+        """Positions as one (N, 2) array with x and y as columns, built on first access.
+
+        For trajectories taken from a `TrajectorySet` this is a view onto the set, no data is
+        copied.
+
+        Returns:
+            np.ndarray: Read-only C-contiguous positions
+        """
+        if self._pos is None:
+            pos = np.empty((len(self), 2), dtype=np.result_type(self.x, self.y))
+            pos[:, 0] = self.x
+            pos[:, 1] = self.y
+            object.__setattr__(self, "_pos", _readonly(pos))
+        return cast(np.ndarray, self._pos)
+
+    @property
+    def sq_displacement_from_start(self) -> np.ndarray:
+        """Combined x and y squared displacement from the first point, computed on first access.
+
+        Returns:
+            np.ndarray: Read-only (x - x[0])**2 + (y - y[0])**2 of every point
+        """
+        if self._sq_displacement is None:
+            out = np.empty(len(self), dtype=np.result_type(self.x, self.y, 0.0))
+            if supports_dtypes(self.x, self.y):
+                sq_displacement_from_start(self.x, self.y, np.array([0, len(self)]), out)
+            else:
+                np.add(np.square(self.x - self.x[:1]), np.square(self.y - self.y[:1]), out=out)
+            object.__setattr__(self, "_sq_displacement", _readonly(out))
+        return cast(np.ndarray, self._sq_displacement)
+
     def _check_jumps(self, positions: np.ndarray) -> None:
-        jump_sensitivity = 0.5
+        if len(positions) and supports_dtypes(positions):
+            if has_jumps(positions, JUMP_SENSITIVITY):
+                _warn_jump(self.serialnumber)
+            return
         max_pos = np.max(np.abs(positions))
-        forward_diff = np.diff(positions)
-        upper_jumps = forward_diff < jump_sensitivity * max_pos * -1
-        lower_jumps = forward_diff > jump_sensitivity * max_pos
-
-        def user_format_warning(
-            message: Warning | str,
-            category: Type[Warning],
-            filename: str,
-            lineno: int,
-            line: Optional[str] = None,
-        ) -> str:
-            return f"Warning: {message}\n"
-
-        if (upper_jumps + lower_jumps).sum() != 0:
-            warnings.formatwarning = user_format_warning
-            warnings.warn(f"Large jumps in trajectory {self.serialnumber} detected.", UserWarning)
+        step_size = np.diff(positions)
+        np.abs(step_size, out=step_size)
+        if np.count_nonzero(step_size > JUMP_SENSITIVITY * max_pos) != 0:
+            _warn_jump(self.serialnumber)
 
     def __len__(self) -> int:
         """Returns number of points in trajectory
@@ -70,24 +200,15 @@ class Trajectory:
         Returns:
             bool: True if t, x, y, and species match. False otherwise. NotImplemented if other is not dict or Trajectory.
         """
-        if isinstance(other, Trajectory):
-            serial_bool = self.serialnumber == other.serialnumber
-            t_bool = np.allclose(self.t, other.t)
-            x_bool = np.allclose(self.x, other.x)
-            y_bool = np.allclose(self.y, other.y)
-            species_bool = np.allclose(self.species, other.species)
-            return serial_bool and t_bool and x_bool and y_bool and species_bool
-        if isinstance(other, dict):
-            if len(other["t"]) != len(self):
-                return False
-            serial_bool = self.serialnumber == other["serialnum"]
-            t_bool = np.allclose(self.t, other["t"])
-            x_bool = np.allclose(self.x, other["x"])
-            y_bool = np.allclose(self.y, other["y"])
-            species_bool = np.allclose(self.species, other["species"])
-            return serial_bool and t_bool and x_bool and y_bool and species_bool
+        return _equals(other, self)
 
-        return NotImplemented
+    def __hash__(self) -> int:
+        """Hash consistent with `__eq__`, which compares floats with a tolerance.
+
+        Returns:
+            int: Hash of serialnumber and length
+        """
+        return hash((self.serialnumber, len(self)))
 
     def __getitem__(self, i: int) -> tuple[int, float, float, float, int]:
         return (
@@ -102,36 +223,188 @@ class Trajectory:
     def adjust_for_periodic_boundaries(
         position: np.ndarray, min_pos: float, max_pos: float
     ) -> np.ndarray:
+        """Removes jumps caused by periodic boundaries from a trajectory.
+
+        A 2D array is treated as one trajectory per row, all rows are adjusted in one call.
+
+        Args:
+            position (np.ndarray): x or y values, 1D or 2D with one trajectory per row
+            min_pos (float): Lower boundary of the periodic box
+            max_pos (float): Upper boundary of the periodic box
+
+        Returns:
+            np.ndarray: Adjusted positions. `position` itself if no boundary was crossed.
+        """
         size = max_pos - min_pos
+        if supports_dtypes(position):
+            adjusted = np.empty(position.shape, dtype=np.float64)
+            kernel = unwrap_periodic_rows if position.ndim == 2 else unwrap_periodic
+            if not kernel(position, size, adjusted):
+                return position
+            return adjusted
         half_delta = 0.5 * (size)
-        forward_diff = np.diff(position, prepend=position[0])
+        forward_diff = np.diff(position, axis=-1, prepend=position[..., :1])
         upper_jumps = forward_diff < -1 * half_delta
         lower_jumps = forward_diff > half_delta
         if (upper_jumps + lower_jumps).sum() == 0:
             return position
-        upper_jumps_cumsum = upper_jumps.cumsum() * size
-        lower_jumps_cumsum = lower_jumps.cumsum() * size * -1
+        upper_jumps_cumsum = upper_jumps.cumsum(axis=-1) * size
+        lower_jumps_cumsum = lower_jumps.cumsum(axis=-1) * size * -1
         position_mask = upper_jumps_cumsum + lower_jumps_cumsum
         return position + position_mask
 
 
-@dataclass(frozen=True, slots=True)
+@functools.singledispatch
+def _equals(other: object, traj: Trajectory) -> bool:
+    """Compares `traj` to `other`, dispatching on the type of `other`.
+
+    The implementation is looked up once per type and cached by `functools.singledispatch`.
+    """
+    return cast(bool, NotImplemented)
+
+
+@_equals.register(Trajectory)
+def _equals_trajectory(other: Trajectory, traj: Trajectory) -> bool:
+    if traj.serialnumber != other.serialnumber or len(other) != len(traj):
+        return False
+    return bool(
+        np.array_equal(traj.species, other.species)
+        and _allclose(traj.t, other.t)
+        and _allclose(traj.x, other.x)
+        and _allclose(traj.y, other.y)
+    )
+
+
+@_equals.register(dict)
+def _equals_dict(other: dict[str, Any], traj: Trajectory) -> bool:
+    return bool(
+        traj.serialnumber == other["serialnum"]
+        and len(other["t"]) == len(traj)
+        and np.array_equal(traj.species, np.asarray(other["species"]))
+        and _allclose(traj.t, other["t"])
+        and _allclose(traj.x, other["x"])
+        and _allclose(traj.y, other["y"])
+    )
+
+
+@dataclass(frozen=True, slots=True, eq=False)
 class TrajectorySet:
-    """Immutable container for set of trajectories."""
+    """Immutable container for set of trajectories.
+
+    Trajectory data is stored as concatenated arrays (structure of arrays). The points of
+    trajectory i are located at `_offsets[i]:_offsets[i + 1]`. x and y are stored as the
+    columns of one (N, 2) array, so both coordinates of a point are adjacent in memory.
+    Indexing or iterating the set yields `Trajectory` objects holding views onto these arrays.
+    """
+
+    _serialnums: np.ndarray
+    _offsets: np.ndarray
+    _t: np.ndarray
+    _xy: np.ndarray
+    _species: np.ndarray
+    _storage: Optional["_AppendBuffers"] = field(default=None, init=False, repr=False)
+    _has_duplicates: Optional[bool] = field(default=None, init=False, repr=False)
 
-    trajectories: tuple[Trajectory, ...]
+    def __post_init__(self) -> None:
+        """Stores species in the smallest integer dtype that holds all species codes."""
+        if len(self._species) > 0:
+            species_dtype = _species_dtype(self._species.min(), self._species.max())
+            object.__setattr__(self, "_species", self._species.astype(species_dtype, copy=False))
 
     @classmethod
-    def from_list(cls, trajectories: Sequence[Trajectory]) -> "TrajectorySet":
+    def from_arrays(
+        cls,
+        serialnums: np.ndarray,
+        offsets: np.ndarray,
+        t: np.ndarray,
+        x: np.ndarray,
+        y: np.ndarray,
+        species: np.ndarray,
+    ) -> "TrajectorySet":
+        """Create TrajectorySet from concatenated arrays.
+
+        Performs the same checks as `Trajectory` for all trajectories at once. Like `Trajectory`,
+        the set stores copies, later changes to the passed arrays do not affect it.
+
+        Args:
+            serialnums (np.ndarray): Serialnumber of each trajectory
+            offsets (np.ndarray): Trajectory i is located at `offsets[i]:offsets[i + 1]`
+            t (np.ndarray): Concatenated t values
+            x (np.ndarray): Concatenated x values
+            y (np.ndarray): Concatenated y values
+            species (np.ndarray): Concatenated species
+
+        Raises:
+            ValueError: Differing lenghts of t, x, y, or species
+            ValueError: >1D for t, x, y, or species
+            ValueError: Offsets do not split the arrays into non-empty trajectories
+            TypeError: Species is not integer
+
+        Returns:
+            TrajectorySet: Contains provided trajectories
+        """
+        n = len(t)
+        if not (len(x) == len(y) == len(species) == n):
+            raise ValueError("t, x, y, and species must have the same length")
+        if t.ndim != 1 or x.ndim != 1 or y.ndim != 1 or species.ndim != 1:
+            raise ValueError("t, x, y, species must be 1D arrays")
+        if not np.issubdtype(species.dtype, np.integer):
+            raise TypeError("Species must be integer-coded")
+        offsets = np.array(offsets, dtype=np.int64)
+        if (
+            len(offsets) != len(serialnums) + 1
+            or offsets[0] != 0
+            or offsets[-1] != n
+            or np.any(np.diff(offsets) < 1)
+        ):
+            raise ValueError("Offsets must split the arrays into one non-empty part per serialnum")
+        xy = np.empty((n, 2), dtype=np.result_type(x, y))
+        xy[:, 0] = x
+        xy[:, 1] = y
+        trajs = cls(np.array(serialnums, dtype=np.int64), offsets, t.copy(), xy, species.copy())
+        trajs._check_jumps_batched(trajs.x)
+        trajs._check_jumps_batched(trajs.y)
+        return trajs
+
+    @classmethod
+    def from_list(
+        cls, trajectories: Iterable[Trajectory], dtype: Optional[npt.DTypeLike] = None
+    ) -> "TrajectorySet":
         """Create TrajectorySet from sequence of trajectories
 
         Args:
-            trajectories (Sequence[Trajectory]): Sequence of `Trajectory` objects.
+            trajectories (Iterable[Trajectory]): `Trajectory` objects, any iterable such as a
+                list or a generator.
+            dtype (npt.DTypeLike, optional): dtype of stored t, x, and y, e.g. np.float32 to
+                halve memory use. Defaults to None, keeping the dtype of the trajectories.
 
         Returns:
             TrajectorySet: Contains provided Trajectories
         """
-        return cls(tuple(trajectories))
+        if not isinstance(trajectories, Sequence):
+            trajectories = tuple(trajectories)
+        n_trajs = len(trajectories)
+        serialnums = np.fromiter(
+            (traj.serialnumber for traj in trajectories), dtype=np.int64, count=n_trajs
+        )
+        lengths = np.fromiter((len(traj) for traj in trajectories), dtype=np.int64, count=n_trajs)
+        offsets = np.zeros(n_trajs + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        xy_dtype = dtype
+        if xy_dtype is None:
+            xy_dtypes = {a.dtype for traj in trajectories for a in (traj.x, traj.y)}
+            xy_dtype = np.result_type(*xy_dtypes) if xy_dtypes else np.float64
+        xy = np.empty((offsets[-1], 2), dtype=xy_dtype)
+        if n_trajs > 0:
+            np.concatenate([traj.x for traj in trajectories], out=xy[:, 0])
+            np.concatenate([traj.y for traj in trajectories], out=xy[:, 1])
+        return cls(
+            serialnums,
+            offsets,
+            _concatenate([traj.t for traj in trajectories], dtype=dtype),
+            xy,
+            _concatenate([traj.species for traj in trajectories], dtype=np.int64),
+        )
 
     def __len__(self) -> int:
         """Returns the number of trajectories in the set
@@ -139,7 +412,35 @@ class TrajectorySet:
         Returns:
             int: Number of stored trajectories
         """
-        return len(self.trajectories)
+        return len(self._serialnums)
+
+    def __eq__(self, other: object) -> bool:
+        """Checks for equality, comparing all trajectories like `Trajectory.__eq__`.
+
+        Args:
+            other (object): TrajectorySet to compare with
+
+        Returns:
+            bool: True if serialnumbers, lengths, and species match and t, x, and y are close.
+                False otherwise. NotImplemented if other is not a TrajectorySet.
+        """
+        if not isinstance(other, TrajectorySet):
+            return NotImplemented
+        return self is other or bool(
+            np.array_equal(self._serialnums, other._serialnums)
+            and np.array_equal(self._offsets, other._offsets)
+            and np.array_equal(self._species, other._species)
+            and _allclose(self._t, other._t)
+            and _allclose(self._xy, other._xy)
+        )
+
+    def __hash__(self) -> int:
+        """Hash consistent with `__eq__`, which compares floats with a tolerance.
+
+        Returns:
+            int: Hash of serialnumbers and trajectory lengths
+        """
+        return hash((self._serialnums.tobytes(), np.diff(self._offsets).tobytes()))
 
     def __getitem__(self, key: int) -> Trajectory:
         """Return trajectory by index.
@@ -148,9 +449,17 @@ class TrajectorySet:
             key (int): Index of trajectory to retrieve
 
         Returns:
-            Trajectory: Trajectory at given index
+            Trajectory: Trajectory at given index. Its arrays are views onto the set.
         """
-        return self.trajectories[key]
+        index = range(len(self))[key]
+        start = self._offsets[index]
+        end = self._offsets[index + 1]
+        return Trajectory._from_validated(
+            int(self._serialnums[index]),
+            t=self._t[start:end],
+            xy=self._xy[start:end],
+            species=self._species[start:end],
+        )
 
     @overload
     def __add__(self, other: "TrajectorySet") -> "TrajectorySet": ...
@@ -160,31 +469,360 @@ class TrajectorySet:
     def __add__(self, other: Union["TrajectorySet", Trajectory]) -> "TrajectorySet":
         """Combines given trajectories
 
+        The combined data is written to over-allocated buffers that are shared with the result.
+        Adding to the result again appends in place, so building a set by repeated `+` takes
+        amortized linear time. Appends to shared buffers are serialized by a lock.
+
         Args:
             other (Union[TrajectorySet, Trajectory]): TrajectorySet or Trajectory to combine with current
 
         Returns:
             TrajectorySet: New TrajectorySet containing the combined trajectories.
         """
-        if isinstance(other, TrajectorySet):
-            return TrajectorySet(self.trajectories + other.trajectories)
         if isinstance(other, Trajectory):
-            return TrajectorySet(self.trajectories + (other,))
+            other = TrajectorySet.from_list((other,))
+        if isinstance(other, TrajectorySet):
+            storage = self._storage
+            if storage is not None:
+                with storage.lock:
+                    if storage.can_append(self, other):
+                        return storage.append(other)
+            # Freshly allocated buffers are not shared yet, appending needs no lock
+            return _AppendBuffers.allocate(self, other).append(other)
         return NotImplemented
 
+    def __reduce__(self) -> tuple[Any, ...]:
+        """Pickles only the data of the set, without the over-allocated append buffers.
+
+        Returns:
+            tuple[Any, ...]: Constructor and stored arrays
+        """
+        return (
+            TrajectorySet,
+            (self._serialnums, self._offsets, self._t, self._xy, self._species),
+        )
+
     def __iter__(self) -> Iterator[Trajectory]:
         """Iterate over trajectories
 
         Yields:
             Trajectory: Trajectorie object
         """
-        return iter(self.trajectories)
+        for serialnumber, start, end in zip(
+            self._serialnums.tolist(), self._offsets[:-1].tolist(), self._offsets[1:].tolist()
+        ):
+            yield Trajectory._from_validated(
+                serialnumber,
+                t=self._t[start:end],
+                xy=self._xy[start:end],
+                species=self._species[start:end],
+            )
+
+    def iter_slices(self) -> Iterator[tuple[int, np.ndarray, np.ndarray, np.ndarray]]:
+        """Iterate over the trajectories as array slices, without creating `Trajectory` objects.
+
+        Yields:
+            tuple[int, np.ndarray, np.ndarray, np.ndarray]: Serialnumber and read-only x, y,
+                and t views of one trajectory
+        """
+        x, y, t = self.x, self.y, self.t
+        for serialnumber, start, end in zip(
+            self._serialnums.tolist(), self._offsets[:-1].tolist(), self._offsets[1:].tolist()
+        ):
+            yield serialnumber, x[start:end], y[start:end], t[start:end]
+
+    @property
+    def trajectories(self) -> tuple[Trajectory, ...]:
+        """Stored trajectories as tuple of `Trajectory` views.
+
+        Returns:
+            tuple[Trajectory, ...]: One `Trajectory` per stored trajectory
+        """
+        return tuple(self)
+
+    @property
+    def is_fixed_grid(self) -> bool:
+        """True if all trajectories have the same number of timepoints."""
+        lengths = np.diff(self._offsets)
+        return bool(np.all(lengths == lengths[0])) if len(lengths) > 0 else True
+
+    def as_grid(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """2D views of the stored data with one trajectory per row.
+
+        Only possible if all trajectories have the same number of timepoints. No data is copied.
+
+        Raises:
+            ValueError: Trajectories have different numbers of timepoints.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: Read-only t, x, y, and species
+                arrays of shape (trajectories, timepoints)
+        """
+        if not self.is_fixed_grid:
+            raise ValueError("Not a fixed grid. Trajectories have different number of timepoints.")
+        shape = (len(self), -1) if len(self) > 0 else (0, 0)
+        return (
+            self.t.reshape(shape),
+            self.x.reshape(shape),
+            self.y.reshape(shape),
+            self.species.reshape(shape),
+        )
+
+    @property
+    def offsets(self) -> np.ndarray:
+        """Trajectory i is located at `offsets[i]:offsets[i + 1]` of the concatenated arrays.
+
+        The arrays returned by this and the following properties are read-only views onto the
+        stored data, they can be handed to other libraries without copying.
+        """
+        return _readonly(self._offsets)
+
+    @property
+    def t(self) -> np.ndarray:
+        """Concatenated t values of all trajectories."""
+        return _readonly(self._t)
+
+    @property
+    def x(self) -> np.ndarray:
+        """Concatenated x values of all trajectories, a strided view onto `xy`."""
+        return _readonly(self._xy[:, 0])
+
+    @property
+    def y(self) -> np.ndarray:
+        """Concatenated y values of all trajectories, a strided view onto `xy`."""
+        return _readonly(self._xy[:, 1])
+
+    @property
+    def xy(self) -> np.ndarray:
+        """Concatenated positions of all trajectories, x and y as columns of an (N, 2) array."""
+        return _readonly(self._xy)
+
+    @property
+    def species(self) -> np.ndarray:
+        """Concatenated species of all trajectories."""
+        return _readonly(self._species)
 
     @property
     def serialnums(self) -> np.ndarray:
-        serialnums = np.zeros(len(self))
-        for index, traj in enumerate(self):
-            serialnums[index] = traj.serialnumber
-        return serialnums
+        """Serialnumbers of all trajectories.
+
+        Returns:
+            np.ndarray: Read-only view of the stored serialnumbers
+        """
+        return _readonly(self._serialnums)
+
+    @property
+    def has_duplicate_serialnums(self) -> bool:
+        """True if a serialnumber occurs more than once, computed on first access."""
+        if self._has_duplicates is None:
+            has_duplicates = _has_duplicates(self._serialnums)
+            object.__setattr__(self, "_has_duplicates", has_duplicates)
+        return cast(bool, self._has_duplicates)
+
+    def all_displacements(self, lag: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        """Calculates x and y displacements of all trajectories at once.
+
+        Displacements are computed on the concatenated arrays, pairs crossing the boundary
+        between two trajectories are dropped afterwards. Use `lag_offsets` to locate the
+        displacements of a single trajectory. The returned arrays are the columns of the
+        result of `all_xy_displacements`.
+
+        Args:
+            lag (int, optional): Controls the shift of the window. Defaults to 1.
+
+        Raises:
+            ValueError: Chosen timelag is bigger than the shortest trajectory is long.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Timelag displacements in x and y direction
+        """
+        xy_displacement = self.all_xy_displacements(lag)
+        return (xy_displacement[:, 0], xy_displacement[:, 1])
+
+    def all_xy_displacements(self, lag: int = 1) -> np.ndarray:
+        """Calculates x and y displacements of all trajectories in one pass over `xy`.
+
+        Args:
+            lag (int, optional): Controls the shift of the window. Defaults to 1.
+
+        Raises:
+            ValueError: Chosen timelag is bigger than the shortest trajectory is long.
+
+        Returns:
+            np.ndarray: Timelag displacements, x and y as columns of an (M, 2) array
+        """
+        lengths = np.diff(self._offsets)
+        if len(lengths) > 0 and lag > lengths.min() - 1:
+            raise ValueError("Timelag is bigger than number of datapoints in x or y")
+        valid = self._pair_mask(lag)
+        xy_displacement = self._xy[lag:] - self._xy[:-lag]
+        return cast(np.ndarray, xy_displacement[valid])
+
+    def lag_offsets(self, lag: int = 1) -> np.ndarray:
+        """Offsets of the trajectories in the output of `all_displacements`.
+
+        Args:
+            lag (int, optional): Timelag used for the displacements. Defaults to 1.
+
+        Returns:
+            np.ndarray: Displacements of trajectory i are located at `offsets[i]:offsets[i + 1]`
+        """
+        return self._offsets - lag * np.arange(len(self) + 1)
+
+    def _check_jumps_batched(self, positions: np.ndarray) -> None:
+        """Warns about large jumps, like `Trajectory._check_jumps` but for all trajectories."""
+        if len(self) == 0:
+            return
+        lengths = np.diff(self._offsets)
+        max_pos = np.maximum.reduceat(np.abs(positions), self._offsets[:-1])
+        threshold = np.repeat(JUMP_SENSITIVITY * max_pos, lengths)[:-1]
+        step_size = np.diff(positions)
+        np.abs(step_size, out=step_size)
+        is_jump = np.greater(step_size, threshold)
+        is_jump &= self._pair_mask(1)
+        if np.count_nonzero(is_jump) == 0:
+            return
+        jump_trajs = np.unique(np.searchsorted(self._offsets, np.flatnonzero(is_jump), "right") - 1)
+        for serialnumber in self._serialnums[jump_trajs]:
+            _warn_jump(int(serialnumber))
+
+    def _pair_mask(self, lag: int) -> np.ndarray:
+        """Marks pairs (i, i + lag) of the concatenated arrays that lie in one trajectory."""
+        pair_start = np.arange(len(self._t) - lag)
+        trajectory_end = np.repeat(self._offsets[1:], np.diff(self._offsets))[: len(pair_start)]
+        return cast(np.ndarray, pair_start + lag < trajectory_end)
+
+
+@dataclass(slots=True)
+class _AppendBuffers:
+    """Over-allocated arrays backing TrajectorySets created by `TrajectorySet.__add__`.
+
+    Every set created from the buffers views a prefix of them. Only the set ending at the
+    currently used length may append in place, all others have to copy.
+    """
+
+    serialnums: np.ndarray
+    offsets: np.ndarray
+    t: np.ndarray
+    xy: np.ndarray
+    species: np.ndarray
+    species_range: tuple[int, int]
+    n_trajs: int = 0
+    n_points: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @classmethod
+    def allocate(cls, trajs: TrajectorySet, other: TrajectorySet) -> "_AppendBuffers":
+        """Allocates buffers with room for twice the combined data and copies `trajs` into them."""
+        n_trajs = len(trajs) + len(other)
+        n_points = len(trajs._t) + len(other._t)
+        species_range = _merge_ranges(
+            _species_range(trajs._species), _species_range(other._species)
+        )
+        buffers = cls(
+            serialnums=np.empty(2 * n_trajs, dtype=trajs._serialnums.dtype),
+            offsets=np.zeros(2 * n_trajs + 1, dtype=np.int64),
+            t=np.empty(2 * n_points, dtype=np.result_type(trajs._t, other._t)),
+            xy=np.empty((2 * n_points, 2), dtype=np.result_type(trajs._xy, other._xy)),
+            species=np.empty(2 * n_points, dtype=_species_dtype(*species_range)),
+            species_range=species_range,
+        )
+        buffers._write(trajs)
+        return buffers
+
+    def can_append(self, trajs: TrajectorySet, other: TrajectorySet) -> bool:
+        """Checks whether `other` can be appended in place to `trajs`, which views these buffers."""
+        species_range = _merge_ranges(self.species_range, _species_range(other._species))
+        return (
+            len(trajs) == self.n_trajs
+            and len(trajs._t) == self.n_points
+            and self.n_trajs + len(other) <= len(self.serialnums)
+            and self.n_points + len(other._t) <= len(self.t)
+            and np.result_type(self.t, other._t) == self.t.dtype
+            and np.result_type(self.xy, other._xy) == self.xy.dtype
+            and _species_dtype(*species_range) == self.species.dtype
+        )
 
-    # TODO: Methods .t, .x, ... that return array of values of all trajectories
+    def append(self, other: TrajectorySet) -> TrajectorySet:
+        """Appends `other` and returns a TrajectorySet viewing all used data."""
+        self.species_range = _merge_ranges(self.species_range, _species_range(other._species))
+        self._write(other)
+        trajs = object.__new__(TrajectorySet)
+        object.__setattr__(trajs, "_serialnums", self.serialnums[: self.n_trajs])
+        object.__setattr__(trajs, "_offsets", self.offsets[: self.n_trajs + 1])
+        object.__setattr__(trajs, "_t", self.t[: self.n_points])
+        object.__setattr__(trajs, "_xy", self.xy[: self.n_points])
+        object.__setattr__(trajs, "_species", self.species[: self.n_points])
+        object.__setattr__(trajs, "_storage", self)
+        object.__setattr__(trajs, "_has_duplicates", None)
+        return trajs
+
+    def _write(self, trajs: TrajectorySet) -> None:
+        """Copies the data of `trajs` behind the used part of the buffers."""
+        n_trajs = self.n_trajs + len(trajs)
+        n_points = self.n_points + len(trajs._t)
+        self.serialnums[self.n_trajs : n_trajs] = trajs._serialnums
+        self.offsets[self.n_trajs + 1 : n_trajs + 1] = trajs._offsets[1:] + self.n_points
+        self.t[self.n_points : n_points] = trajs._t
+        self.xy[self.n_points : n_points] = trajs._xy
+        self.species[self.n_points : n_points] = trajs._species
+        self.n_trajs = n_trajs
+        self.n_points = n_points
+
+
+def _species_dtype(minimum: int, maximum: int) -> np.dtype:
+    """Smallest integer dtype holding all values between minimum and maximum."""
+    return np.promote_types(np.min_scalar_type(minimum), np.min_scalar_type(maximum))
+
+
+def _species_range(species: np.ndarray) -> tuple[int, int]:
+    """Minimum and maximum species code, (0, 0) if there are no species."""
+    if len(species) == 0:
+        return (0, 0)
+    return (int(species.min()), int(species.max()))
+
+
+def _merge_ranges(a: tuple[int, int], b: tuple[int, int]) -> tuple[int, int]:
+    return (min(a[0], b[0]), max(a[1], b[1]))
+
+
+def _has_duplicates(values: np.ndarray) -> bool:
+    """Checks integer values for duplicates without sorting.
+
+    Dense values are counted with np.bincount. Sparse values are scanned with a set, which
+    stops at the first duplicate.
+    """
+    if len(values) < 2:
+        return False
+    minimum, maximum = int(values.min()), int(values.max())
+    if maximum - minimum < len(values) - 1:
+        return True
+    if maximum - minimum < 4 * len(values):
+        return bool(np.bincount(values - minimum).max() > 1)
+    seen: set[int] = set()
+    for value in values.tolist():
+        if value in seen:
+            return True
+        seen.add(value)
+    return False
+
+
+def _readonly(array: np.ndarray) -> np.ndarray:
+    """Returns a read-only view of array."""
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+def _allclose(a: npt.ArrayLike, b: npt.ArrayLike) -> bool:
+    """np.allclose for arrays of equal shape, skipping the tolerance check on exact matches."""
+    a = np.asarray(a)
+    b = np.asarray(b)
+    return a.shape == b.shape and (np.array_equal(a, b) or np.allclose(a, b))
+
+
+def _concatenate(arrays: Sequence[np.ndarray], dtype: Optional[npt.DTypeLike] = None) -> np.ndarray:
+    """Concatenates arrays, returning an empty array if there are none."""
+    if len(arrays) == 0:
+        return np.empty(0, dtype=dtype)
+    return np.concatenate(arrays, dtype=dtype)
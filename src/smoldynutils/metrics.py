@@ -1,16 +1,28 @@
+import threading
 import warnings
-from typing import cast
+from collections import OrderedDict
+from typing import Optional, Sequence
 
 import numpy as np
+from scipy.fft import irfft, next_fast_len, rfft
 from scipy.optimize import curve_fit
 
-from smoldynutils.data_objects import Trajectory
-from smoldynutils.utils import theoretical_msd, theoretical_msd_residue
+from smoldynutils.data_objects import Trajectory, TrajectorySet
+from smoldynutils.metrics_numba import msd_all, supports_dtypes
+from smoldynutils.utils import array_digest, theoretical_msd, theoretical_msd_residue
 
 FloatArray = np.typing.NDArray[np.floating]
 
+FIT_CACHE_SIZE = 4096
+_fit_cache: OrderedDict[
+    tuple[bytes, bytes, bool], tuple[FloatArray, FloatArray, tuple[warnings.WarningMessage, ...]]
+] = OrderedDict()
+_fit_cache_lock = threading.Lock()
 
-def calc_displacements(traj_values: FloatArray, lag: int = 1) -> FloatArray:
+
+def calc_displacements(
+    traj_values: FloatArray, lag: int = 1, *, out: Optional[FloatArray] = None
+) -> FloatArray:
     """Calculates the displacement depending on time lag.
 
     Eq: x(t+lag) - x(t)
@@ -18,6 +30,8 @@ def calc_displacements(traj_values: FloatArray, lag: int = 1) -> FloatArray:
     Args:
         traj_values (np.ndarray): x or y values
         lag (int, optional): Controls the shift of the window. Defaults to 1.
+        out (np.ndarray, optional): Array of length `len(traj_values) - lag` the result is
+            written to. Defaults to None, allocating a new array.
 
     Raises:
         ValueError: Chosen timelag is bigger than the length of x/y
@@ -27,7 +41,7 @@ def calc_displacements(traj_values: FloatArray, lag: int = 1) -> FloatArray:
     """
     if lag > len(traj_values) - 1:
         raise ValueError("Timelag is bigger than length of trajectory.")
-    displacement = traj_values[lag:] - traj_values[:-lag]
+    displacement: FloatArray = np.subtract(traj_values[lag:], traj_values[:-lag], out=out)
     return displacement
 
 
@@ -55,7 +69,7 @@ def calc_xy_displacement(traj: Trajectory, lag: int = 1) -> tuple[np.ndarray, np
 def calc_msd(displacment: np.ndarray) -> np.ndarray:
     """Calculates mean squeared displacement.
 
-    Equation: mean(dx**2)
+    Equation: mean(dx**2). The mean is accumulated in float64, also for float32 input.
 
     Args:
         displacment (np.ndarray): Displacement values.
@@ -64,7 +78,7 @@ def calc_msd(displacment: np.ndarray) -> np.ndarray:
         np.ndarray: Mean squared displacement values.
     """
     squared_displacement = displacment**2
-    mean_squared_displacement = np.array(np.mean(squared_displacement))
+    mean_squared_displacement = np.array(np.mean(squared_displacement, dtype=np.float64))
     return mean_squared_displacement
 
 
@@ -82,21 +96,141 @@ def calc_xy_msd(displacements: tuple[np.ndarray, np.ndarray]) -> tuple[np.ndarra
     return (x_msd, y_msd)
 
 
-def calc_sq_displacement_from_zero(traj_values: FloatArray) -> FloatArray:
+def calc_msd_per_trajectory(
+    trajs: TrajectorySet, lag: int = 1, out: Optional[FloatArray] = None
+) -> FloatArray:
+    """Calculates the combined x and y MSD of every trajectory in a set at one timelag.
+
+    Sums are accumulated in float64 per trajectory in one call, without a Python loop over
+    the trajectories.
+
+    Args:
+        trajs (TrajectorySet): Trajectories for which the MSD is calculated
+        lag (int, optional): Controls the shift of the window. Defaults to 1.
+        out (np.ndarray, optional): float64 array with one entry per trajectory the result is
+            written to. Defaults to None, allocating a new array.
+
+    Raises:
+        ValueError: Chosen timelag is bigger than the shortest trajectory is long.
+
+    Returns:
+        np.ndarray: MSD of each trajectory
+    """
+    if out is None:
+        out = np.empty(len(trajs))
+    if len(trajs) == 0:
+        return out
+    if lag > np.diff(trajs.offsets).min() - 1:
+        raise ValueError("Timelag is bigger than number of datapoints in x or y")
+    if supports_dtypes(trajs.xy):
+        msd_all(trajs.xy, trajs.offsets, lag, out)
+    else:
+        xy_displacement = trajs.all_xy_displacements(lag)
+        squared_displacement = np.einsum(
+            "ij,ij->i", xy_displacement, xy_displacement, dtype=np.float64
+        )
+        offsets = trajs.lag_offsets(lag)
+        np.add.reduceat(squared_displacement, offsets[:-1], out=out)
+        out /= np.diff(offsets)
+    return out
+
+
+def calc_msd_curve(trajs: TrajectorySet, lags: Sequence[int]) -> FloatArray:
+    """Calculates the combined x and y MSD curve of a set of trajectories.
+
+    For every lag the MSDs of all trajectories are computed in one go with
+    `calc_msd_per_trajectory`. MSD(lag) is the mean over the per trajectory MSDs.
+
+    Args:
+        trajs (TrajectorySet): Trajectories for which the MSD curve is calculated
+        lags (Sequence[int]): Timelags at which the MSD is evaluated
+
+    Raises:
+        ValueError: A timelag is bigger than the shortest trajectory is long.
+
+    Returns:
+        np.ndarray: MSD for each of the given lags
+    """
+    msd_curve = np.empty(len(lags))
+    per_traj_msd = np.empty(len(trajs))
+    if len(trajs) > 0 and max(lags, default=0) > np.diff(trajs.offsets).min() - 1:
+        raise ValueError("Timelag is bigger than number of datapoints in x or y")
+    for index, lag in enumerate(lags):
+        calc_msd_per_trajectory(trajs, lag, out=per_traj_msd)
+        msd_curve[index] = np.mean(per_traj_msd)
+    return msd_curve
+
+
+def calc_msd_fft(traj: Trajectory) -> FloatArray:
+    """Calculates the combined x and y MSD of a trajectory at every timelag via FFT.
+
+    Uses MSD(k) = S1(k) - 2*S2(k), where S2 is the position autocorrelation computed with
+    an FFT and S1 the mean of the squared positions entering each lag. This takes
+    O(L log L) for all timelags instead of O(L) per timelag. Positions are centred first,
+    which leaves the MSD unchanged but limits cancellation in float64.
+
+    Args:
+        traj (Trajectory): Trajectory for which MSD will be calculated
+
+    Returns:
+        np.ndarray: float64 MSD at timelags 0 to `len(traj) - 1`
+    """
+    n = len(traj)
+    size = next_fast_len(2 * n, real=True)
+    centred = traj.pos - traj.pos.mean(axis=0, dtype=np.float64)
+    spectrum = rfft(centred, size, axis=0)
+    power = np.einsum("ij,ij->i", spectrum.real, spectrum.real)
+    power += np.einsum("ij,ij->i", spectrum.imag, spectrum.imag)
+    autocorrelation = irfft(power, size)[:n]
+    squared = np.einsum("ij,ij->i", centred, centred)
+    # Lag k drops the last k squared positions from the first and the first k from the second term
+    dropped = np.zeros(n)
+    np.cumsum(squared[: n - 1] + squared[:0:-1], out=dropped[1:])
+    msd: FloatArray = (2 * squared.sum() - dropped - 2 * autocorrelation) / np.arange(n, 0, -1)
+    return msd
+
+
+def calc_sq_displacement_from_zero(
+    traj_values: FloatArray, out: Optional[FloatArray] = None
+) -> FloatArray:
     """Calculates displacement relative to start position.
 
     Args:
-        traj_values (np.ndarray): Position value of Trajectory
+        traj_values (np.ndarray): Position value of Trajectory, or 2D array with one trajectory
+            per row
+        out (np.ndarray, optional): Array the result is written to, the displacement is
+            computed in its dtype. Defaults to None, allocating a new array.
 
     Returns:
         np.ndarray: Displacement from start position.
     """
-    x0 = float(traj_values[0])
-    return (traj_values - x0) ** 2
+    if out is None:
+        out = np.empty(traj_values.shape, dtype=np.result_type(traj_values, 0.0))
+    np.subtract(traj_values, traj_values[..., :1], out=out, dtype=out.dtype)
+    np.square(out, out=out)
+    return out
 
 
-def calc_combined_msd(msds: tuple[np.ndarray, np.ndarray]) -> np.ndarray:
-    return np.array(msds[0] + msds[1])
+def calc_combined_msd(
+    msds: tuple[np.ndarray, np.ndarray], out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Adds up x and y MSD.
+
+    Args:
+        msds (tuple[np.ndarray, np.ndarray]): MSD of x and y
+        out (np.ndarray, optional): Array the result is written to, may be one of the inputs.
+            Defaults to None, allocating a new array.
+
+    Returns:
+        np.ndarray: Combined MSD
+    """
+    x_msd, y_msd = msds
+    if out is None:
+        out = np.empty(
+            np.broadcast_shapes(np.shape(x_msd), np.shape(y_msd)), np.result_type(x_msd, y_msd)
+        )
+    np.add(x_msd, y_msd, out=out)
+    return out
 
 
 def estimate_diffcoff_fullinfo(
@@ -104,44 +238,104 @@ def estimate_diffcoff_fullinfo(
 ) -> tuple[FloatArray, FloatArray]:
     """Estimates diffusion coefficient from MSD.
 
-    Fitted equation is MSD = 4*D*t
+    Fitted equation is MSD = 4*D*t. Fit results are cached by fingerprint of the inputs, so
+    repeated fits of identical data are only computed once. The cache keeps the
+    `FIT_CACHE_SIZE` most recently used fits.
 
     Args:
         msds (np.ndarray): Array of MSD values
         timepoints (np.ndarray): Array of timelag or time values
         add_epsilon (bool, optional): Use equation MSD = 4*D*t + epsilon for fitting. Defaults to False.
-        return_full (bool, optional): Return full information about curve fitting. Defaults to False.
 
     Returns:
-        np.ndarray: _description_
+        tuple[np.ndarray, np.ndarray]: Optimal parameters and their covariance from curve_fit
     """
-
-    if len(timepoints) < 2 and add_epsilon is True:
-        warnings.warn(
-            "Cannot fit with epsilon if only one timelag given. Setting add_epsilon to False.",
-            UserWarning,
-        )
-        add_epsilon = False
-    if add_epsilon is True:
-        line_fit = curve_fit(theoretical_msd_residue, timepoints, msds)
-    else:
-        line_fit = curve_fit(theoretical_msd, timepoints, msds)
-    return cast(tuple[FloatArray, FloatArray], line_fit)
+    add_epsilon = _check_epsilon(timepoints, add_epsilon)
+    msds = np.asarray(msds)
+    timepoints = np.asarray(timepoints)
+    key = (array_digest(msds), array_digest(timepoints), add_epsilon)
+    with _fit_cache_lock:
+        cached = _fit_cache.get(key)
+        if cached is not None:
+            _fit_cache.move_to_end(key)
+    if cached is None:
+        with warnings.catch_warnings(record=True) as fit_warnings:
+            warnings.simplefilter("always")
+            if add_epsilon is True:
+                line_fit = curve_fit(theoretical_msd_residue, timepoints, msds)
+            else:
+                line_fit = curve_fit(theoretical_msd, timepoints, msds)
+        cached = (line_fit[0], line_fit[1], tuple(fit_warnings))
+        # The fit itself runs unlocked, concurrent misses on one key store equal results
+        with _fit_cache_lock:
+            if key not in _fit_cache and len(_fit_cache) >= FIT_CACHE_SIZE:
+                _fit_cache.popitem(last=False)
+            _fit_cache[key] = cached
+            _fit_cache.move_to_end(key)
+    popt, pcov, cached_warnings = cached
+    for fit_warning in cached_warnings:
+        warnings.warn(fit_warning.message, fit_warning.category)
+    return (popt.copy(), pcov.copy())
 
 
 def estimate_diffcoff(msds: np.ndarray, timepoints: np.ndarray, add_epsilon: bool = False) -> float:
     """Estimates diffusion coefficient from MSD.
 
-    Fitted equation is MSD = 4*D*t
+    Fitted equation is MSD = 4*D*t, solved in closed form by linear least squares. Use
+    `estimate_diffcoff_fullinfo` if the covariance of the fit is needed.
 
     Args:
         msds (np.ndarray): Array of MSD values
         timepoints (np.ndarray): Array of timelag or time values
         add_epsilon (bool, optional): Use equation MSD = 4*D*t + epsilon for fitting. Defaults to False.
-        return_full (bool, optional): Return full information about curve fitting. Defaults to False.
 
     Returns:
-        np.ndarray: _description_
+        float: Estimated diffusion coefficient
     """
-    popt, _ = estimate_diffcoff_fullinfo(msds, timepoints, add_epsilon)
-    return float(popt[0])
+    return float(estimate_diffcoffs(np.ravel(msds), np.ravel(timepoints), add_epsilon))
+
+
+def estimate_diffcoffs(
+    msds: np.ndarray, timepoints: np.ndarray, add_epsilon: bool = False
+) -> FloatArray:
+    """Estimates diffusion coefficients of many MSD curves at once.
+
+    Every curve along the last axis is fitted separately with the closed form of
+    `estimate_diffcoff`, all in one vectorized call. The fit is done in the common float
+    dtype of the inputs, float32 input is not upcast.
+
+    Args:
+        msds (np.ndarray): MSD values, one curve per row
+        timepoints (np.ndarray): Timelag or time values, either shared by all curves or one
+            row per curve
+        add_epsilon (bool, optional): Use equation MSD = 4*D*t + epsilon for fitting. Defaults to False.
+
+    Returns:
+        np.ndarray: Estimated diffusion coefficient of each curve, float32 if both inputs are
+            float32, float64 otherwise
+    """
+    add_epsilon = _check_epsilon(timepoints, add_epsilon)
+    dtype = np.result_type(msds, timepoints, np.float32)
+    msd = np.asarray(msds, dtype=dtype)
+    t = np.asarray(timepoints, dtype=dtype)
+    if add_epsilon is True:
+        # Centred t sums to zero, so the MSDs need no centring: sum(t_c * (m - mean(m))) = t_c @ m
+        t = t - t.mean(axis=-1, keepdims=True)
+    if t.ndim == 1:
+        # Shared timepoints: all slopes in one matrix-vector product
+        slope = (msd @ t) / np.dot(t, t)
+    else:
+        t = np.broadcast_to(t, msd.shape)
+        slope = np.einsum("...i,...i->...", t, msd) / np.einsum("...i,...i->...", t, t)
+    diffcoffs: FloatArray = slope / 4
+    return diffcoffs
+
+
+def _check_epsilon(timepoints: np.ndarray, add_epsilon: bool) -> bool:
+    if np.shape(timepoints)[-1] < 2 and add_epsilon is True:
+        warnings.warn(
+            "Cannot fit with epsilon if only one timelag given. Setting add_epsilon to False.",
+            UserWarning,
+        )
+        return False
+    return add_epsilon
@@ -0,0 +1,240 @@
+import math
+
+import numba
+import numpy as np
+
+
+def supports_dtypes(*arrays: np.ndarray) -> bool:
+    """Checks whether the compiled kernels can be used for the given arrays.
+
+    Args:
+        *arrays (np.ndarray): Arrays that would be passed to a kernel
+
+    Returns:
+        bool: True if all arrays hold integer or float (>= 32 bit) values
+    """
+    return all(a.dtype.kind in "iu" or a.dtype in (np.float32, np.float64) for a in arrays)
+
+
+@numba.njit(cache=True, fastmath=True, parallel=True)
+def msd_all(xy: np.ndarray, offsets: np.ndarray, lag: int, out: np.ndarray) -> np.ndarray:
+    """Calculates the combined x and y MSD at one timelag for each trajectory.
+
+    Displacement, square and mean are fused into one pass without temporary arrays.
+    Trajectories are processed in parallel.
+
+    Args:
+        xy (np.ndarray): Concatenated positions of all trajectories, x and y as columns
+        offsets (np.ndarray): Trajectory i is located at `offsets[i]:offsets[i + 1]`
+        lag (int): Timelag, must be smaller than the length of every trajectory
+        out (np.ndarray): Output array with one entry per trajectory
+
+    Returns:
+        np.ndarray: `out`, filled with the MSD of each trajectory
+    """
+    for i in numba.prange(len(offsets) - 1):
+        start = offsets[i]
+        end = offsets[i + 1] - lag
+        total = 0.0
+        for j in range(start, end):
+            dx = xy[j + lag, 0] - xy[j, 0]
+            dy = xy[j + lag, 1] - xy[j, 1]
+            total += dx * dx + dy * dy
+        out[i] = total / (end - start)
+    return out
+
+
+@numba.njit(cache=True, fastmath=True, parallel=True)
+def msd_all_lags(
+    xy: np.ndarray, offsets: np.ndarray, lags: np.ndarray, out: np.ndarray
+) -> np.ndarray:
+    """Calculates the combined x and y MSD at several timelags for each trajectory.
+
+    All timelags of a trajectory are computed while its points are in cache, so the data is
+    read from memory once instead of once per timelag. Trajectories are processed in parallel.
+
+    Args:
+        xy (np.ndarray): Concatenated positions of all trajectories, x and y as columns
+        offsets (np.ndarray): Trajectory i is located at `offsets[i]:offsets[i + 1]`
+        lags (np.ndarray): Timelags, each must be smaller than the length of every trajectory
+        out (np.ndarray): Output array of shape (trajectories, timelags)
+
+    Returns:
+        np.ndarray: `out`, filled with the MSD of each trajectory at each timelag
+    """
+    for i in numba.prange(len(offsets) - 1):
+        start = offsets[i]
+        for k in range(len(lags)):
+            lag = lags[k]
+            end = offsets[i + 1] - lag
+            total = 0.0
+            for j in range(start, end):
+                dx = xy[j + lag, 0] - xy[j, 0]
+                dy = xy[j + lag, 1] - xy[j, 1]
+                total += dx * dx + dy * dy
+            out[i, k] = total / (end - start)
+    return out
+
+
+@numba.njit(cache=True, fastmath=True, parallel=True)
+def sq_displacement_from_start(
+    x: np.ndarray, y: np.ndarray, offsets: np.ndarray, out: np.ndarray
+) -> np.ndarray:
+    """Calculates the combined x and y squared displacement from the start of each trajectory.
+
+    Displacement, square and sum are fused into one pass without temporary arrays.
+    Trajectories are processed in parallel.
+
+    Args:
+        x (np.ndarray): Concatenated x values of all trajectories
+        y (np.ndarray): Concatenated y values of all trajectories
+        offsets (np.ndarray): Trajectory i is located at `offsets[i]:offsets[i + 1]`
+        out (np.ndarray): Output array of the same length as `x`
+
+    Returns:
+        np.ndarray: `out`, filled with the squared displacement of every point
+    """
+    for i in numba.prange(len(offsets) - 1):
+        start = offsets[i]
+        end = offsets[i + 1]
+        if end == start:
+            continue
+        x0 = x[start]
+        y0 = y[start]
+        for j in range(start, end):
+            dx = x[j] - x0
+            dy = y[j] - y0
+            out[j] = dx * dx + dy * dy
+    return out
+
+
+@numba.njit(cache=True)
+def unwrap_periodic(position: np.ndarray, size: float, out: np.ndarray) -> bool:
+    """Undoes jumps across periodic boundaries in a single pass.
+
+    Every step larger than half the box size is counted as a boundary crossing and the
+    position is shifted by the accumulated number of box sizes.
+
+    Args:
+        position (np.ndarray): Positions along one axis
+        size (float): Size of the periodic box
+        out (np.ndarray): Output array of the same length as `position`
+
+    Returns:
+        bool: True if at least one boundary crossing was found
+    """
+    half_size = 0.5 * size
+    wraps = 0
+    wrapped = False
+    if len(position) > 0:
+        out[0] = position[0]
+    for i in range(1, len(position)):
+        step = position[i] - position[i - 1]
+        if step < -half_size:
+            wraps += 1
+            wrapped = True
+        elif step > half_size:
+            wraps -= 1
+            wrapped = True
+        out[i] = position[i] + wraps * size
+    return wrapped
+
+
+@numba.njit(cache=True, parallel=True)
+def unwrap_periodic_rows(position: np.ndarray, size: float, out: np.ndarray) -> bool:
+    """Applies `unwrap_periodic` to each row of a 2D array, one trajectory per row.
+
+    Rows are processed in parallel.
+
+    Args:
+        position (np.ndarray): Positions along one axis, shape (trajectories, timepoints)
+        size (float): Size of the periodic box
+        out (np.ndarray): Output array of the same shape as `position`
+
+    Returns:
+        bool: True if at least one boundary crossing was found in any row
+    """
+    wrapped_rows = 0
+    for i in numba.prange(position.shape[0]):
+        wrapped_rows += unwrap_periodic(position[i], size, out[i])
+    return wrapped_rows > 0
+
+
+@numba.njit(cache=True)
+def has_jumps(positions: np.ndarray, sensitivity: float) -> bool:
+    """Checks for steps larger than `sensitivity` times the largest absolute position.
+
+    Args:
+        positions (np.ndarray): Positions along one axis
+        sensitivity (float): Fraction of the largest absolute position counted as a jump
+
+    Returns:
+        bool: True if at least one step exceeds the threshold. False if `positions` contains NaN.
+    """
+    max_pos = 0.0
+    for i in range(len(positions)):
+        pos = abs(positions[i])
+        if pos != pos:
+            return False
+        if pos > max_pos:
+            max_pos = pos
+    threshold = sensitivity * max_pos
+    for i in range(1, len(positions)):
+        step = positions[i] - positions[i - 1]
+        if step < -threshold or step > threshold:
+            return True
+    return False
+
+
+@numba.njit(cache=True)
+def min_max_mean(values: np.ndarray) -> tuple[float, float, float]:
+    """Minimum, maximum, and mean of a non-empty 1D array in a single pass.
+
+    Args:
+        values (np.ndarray): Values to summarize
+
+    Returns:
+        tuple[float, float, float]: Minimum, maximum, and mean, the mean accumulated in float64
+    """
+    minimum = values[0]
+    maximum = values[0]
+    total = 0.0
+    for value in values:
+        if value < minimum:
+            minimum = value
+        elif value > maximum:
+            maximum = value
+        total += value
+    return float(minimum), float(maximum), total / len(values)
+
+
+@numba.njit(cache=True, fastmath=True)
+def gauss_pdf(x: float, mu: float, sigma: float) -> float:
+    """Probability density of a normal distribution for scalar input, without validation.
+
+    Args:
+        x (float): Value at which the density is evaluated
+        mu (float): Mean
+        sigma (float): Standard deviation, must be > 0
+
+    Returns:
+        float: Probability density at x
+    """
+    diff = x - mu
+    return math.exp(-diff * diff / (2.0 * sigma * sigma)) / (math.sqrt(2.0 * math.pi) * sigma)
+
+
+@numba.njit(cache=True, fastmath=True)
+def brownian_pdf(x: float, D: float, t: float) -> float:
+    """Probability density of a 1D brownian displacement for scalar input, without validation.
+
+    Args:
+        x (float): Displacement at which the density is evaluated
+        D (float): Diffusion coefficient, must be > 0
+        t (float): Time, must be > 0
+
+    Returns:
+        float: Probability density at x
+    """
+    inv_var = 1.0 / (2.0 * D * t)
+    return math.sqrt(inv_var / (2.0 * math.pi)) * math.exp(-0.5 * x * x * inv_var)
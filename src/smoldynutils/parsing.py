@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import os
+import warnings
 from dataclasses import dataclass
-from typing import Optional
+from typing import Literal, Optional, Sequence
 
 import numpy as np
 import numpy.typing as npt
+import pandas as pd
 
 from smoldynutils.data_objects import Trajectory, TrajectorySet
 
@@ -16,6 +19,7 @@ class SmoldynParser:
     dt: float = 0.5
     min_val: Optional[float] = None
     max_val: Optional[float] = None
+    engine: Literal["c", "pyarrow"] = "c"
 
     def parse_fixed_grid(
         self,
@@ -24,9 +28,10 @@ class SmoldynParser:
         dtype_species: npt.DTypeLike = np.uint16,
         dtype_serialnum: npt.DTypeLike = np.uint32,
     ) -> TrajectorySet:
-        """Parser based on numpy loadtxt assuming equal size of all trajectories.
+        """Parser based on pandas read_csv assuming equal size of all trajectories.
 
-        Sorts based on time and serialnumber. Then generates Trajectories based on expected size.
+        Sorts based on time and serialnumber. The sorted columns are stored in a TrajectorySet
+        directly, without creating an intermediate `Trajectory` per serialnumber.
 
         Args:
             path (str): Path to smoldyn data (assuming listmols2 command)
@@ -38,56 +43,118 @@ class SmoldynParser:
         Returns:
             TrajectorySet: Set of read trajectories.
         """
-        file_content = np.loadtxt(self.path, delimiter=self.delimiter, dtype=np.float32)
-        if file_content.size == 0:
+        t, species, x, y, serial_number = self._read_columns(
+            (dtype_t, dtype_species, dtype_xy, dtype_xy, dtype_serialnum)
+        )
+        if len(t) == 0:
             raise ValueError("Data file appears to be empty.")
-        t = file_content[:, 0].astype(dtype_t, copy=False)
-        serial_number = file_content[:, 5].astype(dtype_serialnum, copy=False)
-        order = np.lexsort((t, serial_number))
+        order = self._sort_order(t, serial_number)
 
         t = t[order]
         serial_number = serial_number[order]
-        species = file_content[:, 1].astype(dtype_species, copy=False)[order]
-        x = file_content[:, 3].astype(dtype_xy, copy=False)[order]
-        y = file_content[:, 4].astype(dtype_xy, copy=False)[order]
-        serial_number = file_content[:, 5].astype(dtype_serialnum, copy=False)[order]
+        species = species[order]
+        x = x[order]
+        y = y[order]
+
+        serial_ids, expected = self._grid_serials(serial_number)
 
-        serial_ids, serial_start, serial_counts = np.unique(
-            serial_number, return_index=True, return_counts=True
+        shape = (len(serial_ids), expected)
+        x_rows = x.reshape(shape)
+        y_rows = y.reshape(shape)
+        if self.min_val is not None and self.max_val is not None:
+            x_rows = Trajectory.adjust_for_periodic_boundaries(x_rows, self.min_val, self.max_val)
+            y_rows = Trajectory.adjust_for_periodic_boundaries(y_rows, self.min_val, self.max_val)
+        offsets = np.arange(0, len(t) + 1, expected, dtype=np.int64)
+        return TrajectorySet.from_arrays(
+            serial_ids, offsets, t, x_rows.ravel(), y_rows.ravel(), species
         )
 
-        expected = int(serial_counts[0])
-        if not np.all(serial_counts == expected):
-            raise NotImplementedError(
-                "Not a fixed grid. Serials have different number of timepoints."
-            )
-
-        trajs: list[Trajectory] = []
-        for sid, start in zip(serial_ids, serial_start):
-            end = start + expected
-            if self.min_val is not None and self.max_val is not None:
-                trajs.append(
-                    Trajectory(
-                        int(sid),
-                        t=t[start:end],
-                        x=Trajectory.adjust_for_periodic_boundaries(
-                            x[start:end], self.min_val, self.max_val
-                        ),
-                        y=Trajectory.adjust_for_periodic_boundaries(
-                            y[start:end], self.min_val, self.max_val
-                        ),
-                        species=species[start:end],
-                    )
-                )
-            else:
-                trajs.append(
-                    Trajectory(
-                        int(sid),
-                        t=t[start:end],
-                        x=x[start:end],
-                        y=y[start:end],
-                        species=species[start:end],
-                    )
-                )
+    @staticmethod
+    def _grid_serials(serial_number: np.ndarray) -> tuple[np.ndarray, int]:
+        """Serialnumbers and timepoints per serial of rows sorted by serialnumber.
+
+        The number of timepoints is taken from the first serial. The rows then form a fixed grid
+        if every block of that size holds a single serialnumber, different from the previous
+        block. This avoids the sort of `np.unique`.
+
+        Args:
+            serial_number (np.ndarray): Sorted serialnumbers of all rows
+
+        Raises:
+            NotImplementedError: Serials have different numbers of timepoints
+
+        Returns:
+            tuple[np.ndarray, int]: Serialnumber of each trajectory and timepoints per trajectory
+        """
+        expected = int(np.argmax(serial_number != serial_number[0])) or len(serial_number)
+        if len(serial_number) % expected == 0:
+            serial_rows = serial_number.reshape(-1, expected)
+            serial_ids = serial_rows[:, 0]
+            if np.all(serial_rows == serial_ids[:, np.newaxis]) and np.all(
+                serial_ids[1:] != serial_ids[:-1]
+            ):
+                return serial_ids, expected
+        raise NotImplementedError("Not a fixed grid. Serials have different number of timepoints.")
+
+    def _sort_order(self, t: np.ndarray, serial_number: np.ndarray) -> np.ndarray:
+        """Order sorting the rows by serialnumber, then by time.
+
+        If all timepoints lie on a grid with spacing `dt`, serialnumber and time step are packed
+        into one integer key, which is sorted much faster than the two keys of `np.lexsort`. The
+        key is uint32 if both parts fit into 16 bits, uint64 otherwise. `np.lexsort` is used as
+        well if two rows of one serialnumber share a time step.
 
-        return TrajectorySet(tuple(trajs))
+        Args:
+            t (np.ndarray): Timepoints of all rows
+            serial_number (np.ndarray): Serialnumbers of all rows
+
+        Returns:
+            np.ndarray: Indices sorting the rows
+        """
+        time_step = (t.astype(np.float64) - t.min()) / self.dt
+        time_index = np.rint(time_step)
+        # NaN timepoints fail the grid check, so it has to come before the int conversions
+        if serial_number.min() >= 0 and np.allclose(time_index, time_step, rtol=0, atol=1e-3):
+            max_part = max(int(serial_number.max()), int(time_index.max()))
+            if max_part < 2**32:
+                key_dtype, shift = (np.uint32, 16) if max_part < 2**16 else (np.uint64, 32)
+                key: np.ndarray = serial_number.astype(key_dtype)
+                key <<= shift
+                key |= time_index.astype(key_dtype)
+                order: np.ndarray = np.argsort(key)
+                sorted_key = key[order]
+                # Times rounding to the same step give equal keys, only lexsort orders those by t
+                if not np.any(sorted_key[1:] == sorted_key[:-1]):
+                    return order
+        return np.lexsort((t, serial_number))
+
+    def _read_columns(self, dtypes: Sequence[npt.DTypeLike]) -> list[np.ndarray]:
+        """Reads t, species, x, y, and serialnumber columns with pandas read_csv.
+
+        The unused third column of listmols2 output is skipped while tokenizing and every column
+        is parsed straight into its target dtype. The C engine memory-maps the file. With
+        `engine="pyarrow"` the file is tokenized on multiple threads, this requires pyarrow.
+
+        Args:
+            dtypes (Sequence[npt.DTypeLike]): dtypes of t, species, x, y, and serialnumber
+
+        Returns:
+            list[np.ndarray]: Columns t, species, x, y, and serialnumber
+        """
+        columns = [0, 1, 3, 4, 5]
+        if os.path.getsize(self.path) > 0:
+            try:
+                data_frame = pd.read_csv(
+                    self.path,
+                    sep=self.delimiter,
+                    header=None,
+                    usecols=columns,
+                    dtype=dict(zip(columns, dtypes)),
+                    engine=self.engine,
+                    memory_map=self.engine == "c",
+                )
+                return [data_frame[column].to_numpy() for column in columns]
+            except pd.errors.EmptyDataError:
+                pass
+        warnings.warn(f"{self.path}: input contained no data", UserWarning)
+        return [np.empty(0, dtype=dtype) for dtype in dtypes]
@@ -1,9 +1,11 @@
-from typing import Optional, Sequence, Union, Dict
+from typing import Optional, Sequence, Union, Dict, cast
 
 import numpy as np
 from matplotlib.axes import Axes
+from matplotlib.collections import LineCollection
 
 from smoldynutils.data_objects import Trajectory, TrajectorySet
+from smoldynutils.metrics_numba import min_max_mean, supports_dtypes
 
 import seaborn as sns
 
@@ -19,6 +21,8 @@ def plot_gauss_comparison(
 ) -> Axes:
     """Plots histogram of measured displacement and theoretical displacement.
 
+    Bin edges are determined once from both inputs together, so both histograms share them.
+
     Args:
         displacement (np.ndarray): Measured displacement
         gauss_vals (np.ndarray): Theoretical expectation
@@ -32,21 +36,28 @@ def plot_gauss_comparison(
     Returns:
         Axes: Axis that contains the histogram.
     """
-    ax.hist(displacement, bins=bins, density=True)
-    ax.hist(gauss_vals, bins=bins, density=True)
+    edges = np.histogram_bin_edges(np.concatenate((displacement, gauss_vals)), bins=bins)
+    for values in (displacement, gauss_vals):
+        density, _ = np.histogram(values, bins=edges, density=True)
+        ax.stairs(density, edges, fill=True, alpha=0.5)
     ax.set_xlabel("Δx")
     ax.set_ylabel("density")
     ax.set_title(title)
     return ax
 
 
-def plot_trajectorie(traj: Trajectory, ax: Axes, title: str = "Title") -> Axes:
+def plot_trajectorie(
+    traj: Trajectory, ax: Axes, title: str = "Title", scatter: bool = True
+) -> Axes:
     """Simple xy plot of a single trajectory.
 
     Args:
         traj (Trajectory): Trajectory to plot
         ax (Axes): Axis onto which the trajectory will be plotted
         title (str, optional): Figure title. Defaults to "Title".
+        scatter (bool, optional): Draw every point colored by time on top of a black line. If
+            False, the line itself is colored by time, which is much faster to draw for long
+            trajectories. Defaults to True.
 
     Raises:
         ValueError: No axis to plot onto provided
@@ -55,21 +66,33 @@ def plot_trajectorie(traj: Trajectory, ax: Axes, title: str = "Title") -> Axes:
         Axes: Axis that contains the xy plot
     """
 
-    ax.plot(traj.x, traj.y, color="black")
-    ax.scatter(traj.x, traj.y, c=traj.t)
+    if scatter:
+        ax.plot(traj.x, traj.y, color="black")
+        ax.scatter(traj.x, traj.y, c=traj.t)
+    else:
+        segments = cast(Sequence[np.ndarray], _line_segments(traj.x, traj.y))
+        lines = LineCollection(segments, array=traj.t[:-1])
+        ax.add_collection(lines)
+        ax.autoscale_view()
     ax.set_xlabel("x")
     ax.set_ylabel("y")
     ax.set_title(title)
     return ax
 
 
-def plot_trajectories(trajs: TrajectorySet, ax: Axes, title: str = "Title") -> Axes:
+def plot_trajectories(
+    trajs: TrajectorySet, ax: Axes, title: str = "Title", scatter: bool = True
+) -> Axes:
     """Creates xy plot for multiple trajectories.
 
+    All trajectories are drawn as one LineCollection, and optionally one scatter of all points,
+    instead of separate artists per trajectory.
+
     Args:
         trajs (TrajectorySet): Set of trajectories
         ax (Axes): Axis onto which the trajectory will be plotted
         title (str, optional): Figure title. Defaults to "Title".
+        scatter (bool, optional): Draw every point colored by time. Defaults to True.
 
     Raises:
         ValueError: No axis to plot onto provided
@@ -78,8 +101,18 @@ def plot_trajectories(trajs: TrajectorySet, ax: Axes, title: str = "Title") -> A
         Axes: Axis that contains the xy plot
     """
 
-    for traj in trajs:
-        ax = plot_trajectorie(traj, ax, title)
+    segments = _line_segments(trajs.x, trajs.y)
+    within_trajectory = np.ones(len(segments), dtype=bool)
+    within_trajectory[trajs.offsets[1:-1] - 1] = False
+    ax.add_collection(
+        LineCollection(cast(Sequence[np.ndarray], segments[within_trajectory]), colors="black")
+    )
+    if scatter:
+        ax.scatter(trajs.x, trajs.y, c=trajs.t)
+    ax.autoscale_view()
+    ax.set_xlabel("x")
+    ax.set_ylabel("y")
+    ax.set_title(title)
     return ax
 
 
@@ -96,10 +129,10 @@ def plot_msd(
         color = "blue"
     if len(msd.shape) > 2:
         raise ValueError("Input MSD array is > 2D")
-    if not len(msd) == len(time):
-        msd = msd.T
-        if not len(msd) == len(time):
+    if msd.shape[0] != time.shape[0]:
+        if msd.shape[-1] != time.shape[0]:
             raise ValueError("Input MSD array and time array have no shape in common.")
+        msd = msd.T
     ax.plot(time, msd, color=color)
     ax.set_xlabel("time")
     ax.set_ylabel("msd")
@@ -131,11 +164,8 @@ def plot_msd_comparison(
         )
     if time is None:
         time = np.arange(len(msd))
-    ax = plot_msd(msd, ax, time=time)
-    ax = plot_msd(theoretical_msd, ax, time=time, color="red")
-    ax.set_xlabel("time")
-    ax.set_ylabel("msd")
-    ax.set_title(title)
+    ax = plot_msd(msd, ax, time=time, title=title)
+    ax = plot_msd(theoretical_msd, ax, time=time, title=title, color="red")
     return ax
 
 
@@ -154,13 +184,20 @@ def plot_diffconst_hist(
         Axes: Axes with histogram
     """
 
-    lower_bound = min(diffcoffs)
-    upper_bound = max(diffcoffs)
-    bins = list(np.linspace(lower_bound, upper_bound, 20))
-    ax.hist(diffcoffs, bins=bins)
+    diffcoffs = np.ravel(diffcoffs)
+    if supports_dtypes(diffcoffs):
+        lower_bound, upper_bound, mean = min_max_mean(diffcoffs)
+    else:
+        lower_bound, upper_bound, mean = (
+            float(diffcoffs.min()),
+            float(diffcoffs.max()),
+            float(diffcoffs.mean(dtype=np.float64)),
+        )
+    counts, edges = np.histogram(diffcoffs, bins=np.linspace(lower_bound, upper_bound, 20))
+    ax.stairs(counts, edges, fill=True)
     ax.set_xscale("log")
 
-    ax.axvline(float(np.mean(diffcoffs)))
+    ax.axvline(mean)
 
     ax.axvline(reference_diffcoff)
 
@@ -218,3 +255,9 @@ def plot_violin_with_mean(
     ax.set_ylabel("Diffusion coefficient")
     ax.set_title(title)
     return ax
+
+
+def _line_segments(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Segments between consecutive points, shape (len(x) - 1, 2, 2) as used by LineCollection."""
+    points = np.column_stack((x, y))
+    return np.stack((points[:-1], points[1:]), axis=1)
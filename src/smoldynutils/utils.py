@@ -1,22 +1,73 @@
+import hashlib
+import math
+from typing import Union, cast, overload
+
 import numpy as np
 
+from smoldynutils.metrics_numba import brownian_pdf, gauss_pdf
+
+
+def array_digest(*arrays: np.ndarray) -> bytes:
+    """Fingerprint of the dtype, shape, and content of arrays.
+
+    Args:
+        *arrays (np.ndarray): Arrays to fingerprint
+
+    Returns:
+        bytes: BLAKE2b digest over all arrays
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    for values in arrays:
+        hasher.update(f"{values.dtype.str}{values.shape}".encode())
+        hasher.update(np.ascontiguousarray(values))
+    return hasher.digest()
+
 
-def gauss_probability_density(x: float, mu: float, sigma: float) -> float:
-    if sigma <= 0:
+@overload
+def gauss_probability_density(x: float, mu: float, sigma: float) -> float: ...
+@overload
+def gauss_probability_density(x: np.ndarray, mu: float, sigma: float) -> np.ndarray: ...
+
+
+def gauss_probability_density(
+    x: Union[float, np.ndarray], mu: float, sigma: float
+) -> Union[float, np.ndarray]:
+    if not sigma > 0:
         raise ValueError("sigma must be > 0")
+    if np.ndim(x) == 0:
+        return float(gauss_pdf(float(x), float(mu), float(sigma)))
+    return _gauss_density(cast(np.ndarray, x), mu, 1 / (sigma * sigma))
+
 
-    value = (1 / (np.sqrt(2 * np.pi) * sigma)) * np.exp(-np.square(x - mu) / (2 * sigma**2))
-    return float(value)
+@overload
+def theoretical_brownian_motion_pdf(x: float, D: float, t: float) -> float: ...
+@overload
+def theoretical_brownian_motion_pdf(x: np.ndarray, D: float, t: float) -> np.ndarray: ...
 
 
-def theoretical_brownian_motion_pdf(x: float, D: float, t: float) -> float:
-    if D <= 0:
+def theoretical_brownian_motion_pdf(
+    x: Union[float, np.ndarray], D: float, t: float
+) -> Union[float, np.ndarray]:
+    if not D > 0:
         raise ValueError("D must be > 0")
-    if t < 0:
+    if not t >= 0:
         raise ValueError("t must be >= 0")
-    sigma = np.sqrt(2 * D * t)
-    mu = 0
-    return gauss_probability_density(x, mu, sigma)
+    if t == 0:
+        raise ValueError("sigma must be > 0")
+    if np.ndim(x) == 0:
+        return float(brownian_pdf(float(x), float(D), float(t)))
+    # sigma^2 = 2*D*t is used directly, no sqrt followed by a square
+    return _gauss_density(cast(np.ndarray, x), 0, 1 / (2 * D * t))
+
+
+def _gauss_density(x: np.ndarray, mu: float, inv_var: float) -> np.ndarray:
+    """Normal density with precomputed 1 / sigma^2, in place on one float64 buffer."""
+    density: np.ndarray = np.subtract(x, mu, dtype=np.float64)
+    np.multiply(density, density, out=density)
+    density *= -0.5 * inv_var
+    np.exp(density, out=density)
+    density *= math.sqrt(inv_var / (2 * math.pi))
+    return density
 
 
 def theoretical_msd(t: float, D: float) -> float:
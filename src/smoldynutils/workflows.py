@@ -1,97 +1,236 @@
-from typing import Dict, Sequence
+from typing import Dict, Literal, Sequence, Union, overload
 
 import numpy as np
 
 from smoldynutils.data_objects import Trajectory, TrajectorySet
 from smoldynutils.metrics import (
-    calc_combined_msd,
+    calc_msd_fft,
+    calc_msd_per_trajectory,
     calc_sq_displacement_from_zero,
-    calc_xy_displacement,
-    calc_xy_msd,
-    estimate_diffcoff,
+    estimate_diffcoffs,
 )
+from smoldynutils.metrics_numba import msd_all_lags, sq_displacement_from_start, supports_dtypes
 
+# From this many timelags on, computing the MSD of all lags via FFT is faster than
+# computing the displacements of each lag in the compiled direct path.
+FFT_MIN_TIMELAGS = 64
 
-def estimate_timelag_msd_from_traj(traj: Trajectory, timelags: Sequence[int]) -> Dict[int, float]:
+
+def estimate_timelag_msd_from_traj(
+    traj: Trajectory,
+    timelags: Sequence[int],
+    method: Literal["auto", "direct", "fft"] = "auto",
+) -> Dict[int, float]:
     """Calculates MSD(timelag) for trajectory.
 
     Args:
         traj (Trajectory): Trajectory for which MSD will be calculated
         timelags (Sequence[int]): Sequence of timelags that will be used
+        method (Literal["auto", "direct", "fft"], optional): See
+            `estimate_timelag_msd_from_traj_array`. Defaults to "auto".
+
+    Raises:
+        ValueError: A timelag is not positive or bigger than the trajectory is long.
+        ValueError: Unknown method.
 
     Returns:
         Dict[int, float]: Keys are timelags, values the corresponding MSD
     """
-    msd_dict = {}
-    for timelag in timelags:
-        xy_displacement = calc_xy_displacement(traj, timelag)
-        xy_msd = calc_xy_msd(xy_displacement)
-        msd = calc_combined_msd(xy_msd)
-        msd_dict[timelag] = float(msd)
-    return msd_dict
+    msds = estimate_timelag_msd_from_traj_array(traj, timelags, method)
+    return dict(zip(timelags, msds.tolist()))
+
+
+def estimate_timelag_msd_from_traj_array(
+    traj: Trajectory,
+    timelags: Sequence[int],
+    method: Literal["auto", "direct", "fft"] = "auto",
+) -> np.ndarray:
+    """Calculates MSD(timelag) for trajectory as array.
+
+    The "direct" method sums the squared displacements of every timelag in float64 in a
+    compiled loop without temporary arrays, its cost grows with the number of timelags. The
+    "fft" method computes the MSD of all timelags at once in O(L log L) with `calc_msd_fft`.
+    "auto" uses FFT from `FFT_MIN_TIMELAGS` timelags on.
+
+    Args:
+        traj (Trajectory): Trajectory for which MSD will be calculated
+        timelags (Sequence[int]): Sequence of timelags that will be used
+        method (Literal["auto", "direct", "fft"], optional): Algorithm used. Defaults to "auto".
+
+    Raises:
+        ValueError: A timelag is not positive or bigger than the trajectory is long.
+        ValueError: Unknown method.
+
+    Returns:
+        np.ndarray: float64 MSD for each of the given timelags, in the same order
+    """
+    if method not in ("auto", "direct", "fft"):
+        raise ValueError(f"Unknown method {method!r}, expected 'auto', 'direct', or 'fft'")
+    lags = np.asarray(timelags, dtype=np.int64).reshape(-1)
+    if len(lags) == 0:
+        return np.empty(0)
+    if lags.min() < 1:
+        raise ValueError("Timelags must be positive")
+    if lags.max() > len(traj) - 1:
+        raise ValueError("Timelag is bigger than number of datapoints in x or y")
+    if method == "fft" or (method == "auto" and len(lags) >= FFT_MIN_TIMELAGS):
+        msds: np.ndarray = calc_msd_fft(traj)[lags]
+        return msds
+    if supports_dtypes(traj.pos):
+        msds = np.empty(len(lags))
+        msd_all_lags(traj.pos, np.array([0, len(traj)]), lags, msds.reshape(1, -1))
+        return msds
+    # All (i, i + lag) pairs of all lags in one index array, one segment per lag.
+    counts = len(traj) - lags
+    starts = np.zeros(len(lags), dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+    lower = np.arange(counts.sum()) - np.repeat(starts, counts)
+    upper = lower + np.repeat(lags, counts)
+    dx = np.subtract(traj.x[upper], traj.x[lower], dtype=np.float64)
+    dy = np.subtract(traj.y[upper], traj.y[lower], dtype=np.float64)
+    np.multiply(dx, dx, out=dx)
+    dx += np.multiply(dy, dy, out=dy)
+    msds = np.add.reduceat(dx, starts) / counts
+    return msds
+
+
+@overload
+def estimate_timelag_diffcoff_from_trajset(
+    trajs: TrajectorySet,
+    timelags: Sequence[int] = ...,
+    add_epsilon: bool = ...,
+    *,
+    as_array: Literal[False] = ...,
+) -> Dict[int, float]: ...
+@overload
+def estimate_timelag_diffcoff_from_trajset(
+    trajs: TrajectorySet,
+    timelags: Sequence[int] = ...,
+    add_epsilon: bool = ...,
+    *,
+    as_array: Literal[True],
+) -> np.ndarray: ...
 
 
 def estimate_timelag_diffcoff_from_trajset(
-    trajs: TrajectorySet, timelags: Sequence[int] = (1, 2, 3, 4), add_epsilon: bool = False
-) -> Dict[int, float]:
+    trajs: TrajectorySet,
+    timelags: Sequence[int] = (1, 2, 3, 4),
+    add_epsilon: bool = False,
+    *,
+    as_array: bool = False,
+) -> Union[Dict[int, float], np.ndarray]:
     """Calculates observed diffusion coefficient based on MSD(timelag) for set of trajectories
 
+    The MSDs of all trajectories at all timelags are computed in one pass over the whole set,
+    in parallel over the trajectories.
+
     Args:
         trajs (TrajectorySet): Set of trajectories for which diff coff will be calculated
         timelags (Sequence[int], optional): Sequence of timelags for MSD calculation. Defaults to (1, 2, 3, 4).
+        as_array (bool, optional): Return an array with one diff coff per trajectory, in the
+            order of `trajs`, instead of a dict. Defaults to False.
+
+    Raises:
+        ValueError: A timelag is not positive or bigger than the shortest trajectory is long.
 
     Returns:
-        Dict[int, float]: Keys are trajectory serialnums or index, values the corresponding diff coff.
+        Union[Dict[int, float], np.ndarray]: Keys are trajectory serialnums or index, values the
+            corresponding diff coff. Array of diff coffs if `as_array` is True.
     """
-    diffcoffs = {}
-    use_index_for_dict = False
-    timelag_array = np.array(timelags)
-    if len(np.unique(trajs.serialnums)) < len(trajs):
-        use_index_for_dict = True
-    for index, traj in enumerate(trajs):
-        msd_dict = estimate_timelag_msd_from_traj(traj, timelags)
-        msds = np.array(list(msd_dict.values()))
-        if use_index_for_dict is True:
-            diffcoffs[index] = estimate_diffcoff(msds, timelag_array, add_epsilon=add_epsilon)
-        else:
-            diffcoffs[traj.serialnumber] = estimate_diffcoff(
-                msds, timelag_array, add_epsilon=add_epsilon
-            )
-    return diffcoffs
+    lags = np.asarray(timelags, dtype=np.int64).reshape(-1)
+    timelag_array = lags.astype(np.float64)
+    if len(lags) > 0 and lags.min() < 1:
+        raise ValueError("Timelags must be positive")
+    if supports_dtypes(trajs.xy):
+        if len(trajs) > 0 and len(lags) > 0 and lags.max() > np.diff(trajs.offsets).min() - 1:
+            raise ValueError("Timelag is bigger than number of datapoints in x or y")
+        msds = msd_all_lags(trajs.xy, trajs.offsets, lags, np.empty((len(trajs), len(lags))))
+    else:
+        msds = np.empty((len(lags), len(trajs)))
+        for row, timelag in enumerate(lags.tolist()):
+            calc_msd_per_trajectory(trajs, timelag, out=msds[row])
+        msds = msds.T
+    estimated = estimate_diffcoffs(msds, timelag_array, add_epsilon=add_epsilon)
+    return estimated if as_array else _diffcoff_dict(trajs, estimated)
 
 
 def estimate_time_msd_from_traj(traj: Trajectory) -> np.ndarray:
     """Calculates MSD(time) for trajectory.
 
+    Displacement from the start, square and sum over x and y are fused into one pass. The
+    result is cached on the trajectory, repeated calls only copy it.
+
     Args:
         traj (Trajectory): Trajectory for which MSD will be calculated
 
     Returns:
-        np.ndarray: Calculated MSDs.
+        np.ndarray: Calculated MSDs
     """
-    x_sqdisplacement = calc_sq_displacement_from_zero(traj.x)
-    y_sqdisplacement = calc_sq_displacement_from_zero(traj.y)
-    msd = calc_combined_msd((x_sqdisplacement, y_sqdisplacement))
-    return msd
+    msds: np.ndarray = traj.sq_displacement_from_start.copy()
+    return msds
 
 
-def estimate_time_diffcoff_from_trajset(trajs: TrajectorySet) -> Dict[int, float]:
+@overload
+def estimate_time_diffcoff_from_trajset(
+    trajs: TrajectorySet, *, as_array: Literal[False] = ...
+) -> Dict[int, float]: ...
+@overload
+def estimate_time_diffcoff_from_trajset(
+    trajs: TrajectorySet, *, as_array: Literal[True]
+) -> np.ndarray: ...
+
+
+def estimate_time_diffcoff_from_trajset(
+    trajs: TrajectorySet, *, as_array: bool = False
+) -> Union[Dict[int, float], np.ndarray]:
     """Estimates diffusion coefficient of set of Trajectories based on MSD(time)
 
+    The MSDs of all trajectories are computed in one pass over the concatenated data, in
+    parallel over the trajectories, and fitted without a loop over the trajectories.
+    float32 trajectories are processed in float32 throughout. This halves the memory
+    traffic, and its relative error of about 1e-6 is far below the statistical error
+    of the estimate.
+
     Args:
         trajs (TrajectorySet): Set of trajectories for which diffusion coefficient will be estimated.
+        as_array (bool, optional): Return an array with one diffcoff per trajectory, in the
+            order of `trajs`, instead of a dict. Defaults to False.
 
     Returns:
-        Dict[int, float]: Keys are serialnums or index, values are diffcoffs
+        Union[Dict[int, float], np.ndarray]: Keys are serialnums or index, values are diffcoffs.
+            Array of diffcoffs if `as_array` is True.
     """
-    diffcoffs = {}
-    use_index_for_dict = False
-    if len(np.unique(trajs.serialnums)) < len(trajs):
-        use_index_for_dict = True
-    for index, traj in enumerate(trajs):
-        msd = estimate_time_msd_from_traj(traj)
-        if use_index_for_dict is True:
-            diffcoffs[index] = estimate_diffcoff(msd, traj.t)
+    if trajs.is_fixed_grid:
+        t, x, y, _ = trajs.as_grid()
+        msds = np.empty(x.shape, dtype=np.result_type(x, y, np.float32))
+        if supports_dtypes(x, y):
+            sq_displacement_from_start(trajs.x, trajs.y, trajs.offsets, msds.reshape(-1))
         else:
-            diffcoffs[traj.serialnumber] = estimate_diffcoff(msd, traj.t)
-    return diffcoffs
+            # float16 would overflow when squaring displacements above about 256
+            calc_sq_displacement_from_zero(x, out=msds)
+            msds += calc_sq_displacement_from_zero(y, out=np.empty_like(msds))
+        estimated = estimate_diffcoffs(msds, t)
+        return estimated if as_array else _diffcoff_dict(trajs, estimated)
+    # Trajectories of different length: all MSDs in one parallel pass, one fit per segment
+    x, y, offsets = trajs.x, trajs.y, trajs.offsets
+    dtype = np.result_type(x, y, trajs.t, np.float32)
+    msd = np.empty(len(x), dtype=dtype)
+    if supports_dtypes(x, y):
+        sq_displacement_from_start(x, y, offsets, msd)
+    else:
+        starts = np.repeat(offsets[:-1], np.diff(offsets))
+        dx = np.subtract(x, x[starts], dtype=dtype)
+        dy = np.subtract(y, y[starts], dtype=dtype)
+        np.multiply(dx, dx, out=dx)
+        np.multiply(dy, dy, out=dy)
+        np.add(dx, dy, out=msd)
+    t = trajs.t.astype(dtype, copy=False)
+    slopes = np.add.reduceat(t * msd, offsets[:-1]) / np.add.reduceat(t * t, offsets[:-1])
+    estimated = slopes / 4
+    return estimated if as_array else _diffcoff_dict(trajs, estimated)
+
+
+def _diffcoff_dict(trajs: TrajectorySet, diffcoffs: np.ndarray) -> Dict[int, float]:
+    """Keys diffcoffs by serialnumber, or by index if the serialnumbers are not unique."""
+    keys = range(len(trajs)) if trajs.has_duplicate_serialnums else trajs.serialnums.tolist()
+    return dict(zip(keys, diffcoffs.tolist()))
@@ -1,4 +1,7 @@
+import pickle
 import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, cast
 
 import numpy as np
@@ -62,6 +65,14 @@ def test_trajectory_addition():
         added_trajs3 = trajs + cast(Any, 5)
 
 
+def test_trajset_from_iterable():
+    t, x, y, species = _get_arrays()
+    trajs = TrajectorySet.from_list(Trajectory(n, t, x, y, species) for n in range(1, 4))
+    assert len(trajs) == 3
+    np.testing.assert_equal(trajs.serialnums, [1, 2, 3])
+    np.testing.assert_array_equal(TrajectorySet.from_list(iter(trajs)).xy, trajs.xy)
+
+
 def test_trajectory_iter():
     t, x, y, species = _get_arrays()
     traj = Trajectory(1, t, x, y, species)
@@ -73,6 +84,14 @@ def test_trajectory_iter():
         else:
             assert traj.serialnumber == 2
 
+    for traj, (serialnumber, x_view, y_view, t_view) in zip(trajs, trajs.iter_slices()):
+        assert serialnumber == traj.serialnumber
+        np.testing.assert_array_equal(x_view, traj.x)
+        np.testing.assert_array_equal(y_view, traj.y)
+        np.testing.assert_array_equal(t_view, traj.t)
+        assert np.shares_memory(x_view, trajs.xy)
+        assert not t_view.flags.writeable
+
 
 def test_raises_jump_warning():
     t, _, y, species = _get_arrays()
@@ -102,3 +121,268 @@ def test_trajset_serialnums():
             4,
         ],
     )
+    assert np.issubdtype(trajs.serialnums.dtype, np.integer)
+    with pytest.raises(ValueError):
+        trajs.serialnums[0] = 5
+    assert not trajs.has_duplicate_serialnums
+    assert (trajs + traj_list[0]).has_duplicate_serialnums
+    assert not TrajectorySet.from_list([]).has_duplicate_serialnums
+    sparse = TrajectorySet.from_list([Trajectory(n, t, x, y, species) for n in (1, 10**9, 5)])
+    assert not sparse.has_duplicate_serialnums
+    assert (sparse + Trajectory(10**9, t, x, y, species)).has_duplicate_serialnums
+
+
+def test_trajset_views():
+    t, x, y, species = _get_arrays()
+    trajs = TrajectorySet.from_list([Trajectory(n, t, x, y, species) for n in range(1, 4)])
+    assert trajs[-1].serialnumber == 3
+    assert trajs[1] == {"t": t, "x": x, "y": y, "species": species, "serialnum": 2}
+    assert not trajs[0].x.flags.owndata
+    np.testing.assert_array_equal(trajs.xy, np.column_stack((trajs.x, trajs.y)))
+    assert np.shares_memory(trajs.xy, trajs[1].y)
+    for array in (trajs.offsets, trajs.t, trajs.x, trajs.y, trajs.xy, trajs.species):
+        assert not array.flags.writeable
+    with pytest.raises(ValueError):
+        trajs.x[0] = 5
+    for traj in (trajs[0], next(iter(trajs))):
+        for array in (traj.t, traj.x, traj.y, traj.species, traj.pos):
+            assert not array.flags.writeable
+        with pytest.raises(ValueError):
+            traj.x[0] = 9
+    with pytest.raises(IndexError):
+        trajs[3]
+
+
+def test_trajset_all_displacements():
+    t, x, y, species = _get_arrays()
+    trajs = TrajectorySet.from_list([Trajectory(n, t, x, y, species) for n in range(1, 4)])
+    x_displ, y_displ = trajs.all_displacements(lag=2)
+    np.testing.assert_allclose(x_displ, [x[2] - x[0]] * 3)
+    np.testing.assert_allclose(y_displ, [y[2] - y[0]] * 3)
+    x_displ, _ = trajs.all_displacements(lag=1)
+    np.testing.assert_allclose(x_displ, [x[1] - x[0], x[2] - x[1]] * 3)
+    with pytest.raises(ValueError):
+        trajs.all_displacements(lag=3)
+
+
+def test_traj_equality():
+    t, x, y, species = _get_arrays()
+    traj = Trajectory(1, t, x, y, species)
+    assert traj == Trajectory(1, t.copy(), x + 1e-9, y, species.astype(np.int64))
+    assert traj != Trajectory(2, t, x, y, species)
+    assert traj != Trajectory(1, t, x, y, np.array([0, 1, 1]))
+    assert traj != Trajectory(1, t[:2], x[:2], y[:2], species[:2])
+    assert traj != {"t": t, "x": x[:2], "y": y, "species": species, "serialnum": 1}
+    assert traj == OrderedDict(t=t, x=x, y=y, species=species, serialnum=1)
+    assert traj == {"t": t, "x": x, "y": y, "species": species.tolist(), "serialnum": 1}
+    assert traj != {
+        "t": t,
+        "x": x,
+        "y": y,
+        "species": species.astype(np.int64) + 256,
+        "serialnum": 1,
+    }
+    assert traj != "trajectory"
+    nan_x = np.array([1.0, np.nan, 1.4], dtype=np.float32)
+    nan_traj = Trajectory(1, t, nan_x, y, species)
+    assert nan_traj.digest == Trajectory(1, t, nan_x, y, species).digest
+    assert nan_traj != Trajectory(1, t, nan_x, y, species)
+    assert nan_traj != {"t": t, "x": nan_x, "y": y, "species": species, "serialnum": 1}
+
+
+def test_traj_sq_displacement_from_start():
+    t, x, y, species = _get_arrays()
+    expected = (x - x[0]) ** 2 + (y - y[0]) ** 2
+    for dtype in (np.float32, np.float16):
+        traj = Trajectory(1, t, x.astype(dtype), y.astype(dtype), species)
+        sq_displacement = traj.sq_displacement_from_start
+        np.testing.assert_allclose(sq_displacement, expected, rtol=1e-2)
+        assert sq_displacement.dtype == dtype
+        assert not sq_displacement.flags.writeable
+        assert traj.sq_displacement_from_start is sq_displacement
+
+
+def test_traj_pos():
+    t, x, y, species = _get_arrays()
+    traj = Trajectory(1, t, x, y, species)
+    np.testing.assert_array_equal(traj.pos, np.column_stack((x, y)))
+    assert traj.pos.flags.c_contiguous and not traj.pos.flags.writeable
+    assert traj.pos is traj.pos
+    pos = traj.pos.copy()
+    x[0] = 1.1
+    np.testing.assert_array_equal(traj.pos, pos)
+    np.testing.assert_array_equal(traj.pos[:, 0], traj.x)
+    trajs = TrajectorySet.from_list([traj, traj])
+    for traj_view in (trajs[1], list(trajs)[1]):
+        np.testing.assert_array_equal(traj_view.pos, traj.pos)
+        assert np.shares_memory(traj_view.pos, trajs.xy)
+        assert np.shares_memory(traj_view.x, traj_view.pos)
+
+
+def test_traj_hash():
+    t, x, y, species = _get_arrays()
+    traj = Trajectory(1, t, x, y, species)
+    same_traj = Trajectory(1, t.copy(), x.copy(), y.copy(), species.copy())
+    assert traj.digest == same_traj.digest
+    assert traj.digest != Trajectory(1, t, y, x, species).digest
+    assert len({traj, same_traj, Trajectory(2, t, x, y, species)}) == 2
+    assert TrajectorySet.from_list([traj])[0] in {traj}
+    for array in (traj.t, traj.x, traj.y, traj.species):
+        assert not array.flags.writeable
+    with pytest.raises(ValueError):
+        traj.x[0] = 9
+    assert t.flags.writeable
+
+
+def test_traj_owns_data():
+    t, x, y, species = _get_arrays()
+    traj = Trajectory(1, t, x, y, species)
+    same_traj = Trajectory(1, t.copy(), x.copy(), y.copy(), species.copy())
+    assert traj.digest == same_traj.digest
+    x[0] = 1.1
+    np.testing.assert_array_equal(traj.x, same_traj.x)
+    assert traj == same_traj
+    assert traj != Trajectory(1, t, x, y, species)
+
+
+def test_trajset_equality():
+    t, x, y, species = _get_arrays()
+    traj = Trajectory(1, t, x, y, species)
+    trajs = TrajectorySet.from_list([traj, Trajectory(2, t, x, y, species)])
+    same_trajs = TrajectorySet.from_list([traj]) + Trajectory(2, t.copy(), x + 1e-9, y, species)
+    assert trajs == same_trajs
+    assert hash(trajs) == hash(same_trajs)
+    assert TrajectorySet.from_list([traj]) == TrajectorySet.from_list([traj])
+    assert trajs != TrajectorySet.from_list([traj, Trajectory(3, t, x, y, species)])
+    assert trajs != TrajectorySet.from_list([traj, Trajectory(2, t, x + 1, y, species)])
+    assert trajs != TrajectorySet.from_list([traj, Trajectory(2, t, x, y, species + 1)])
+    assert trajs != TrajectorySet.from_list([traj])
+    assert trajs.__eq__(traj) is NotImplemented
+
+
+def test_trajset_from_arrays():
+    t, x, y, species = _get_arrays()
+    jump_x = np.array([0, 2, 4, 0], dtype=np.float32)
+    with pytest.warns(UserWarning, match="Large jumps in trajectory 2 detected.") as record:
+        trajs = TrajectorySet.from_arrays(
+            np.array([1, 2]),
+            np.array([0, 3, 7]),
+            np.concatenate((t, t, [0.3])),
+            np.concatenate((x, jump_x)),
+            np.concatenate((y, y, [0.2])),
+            np.concatenate((species, species, [1])),
+        )
+    assert len(record) == 1
+    assert len(trajs) == 2
+    assert trajs[1] == {
+        "t": np.append(t, 0.3),
+        "x": jump_x,
+        "y": np.append(y, 0.2),
+        "species": np.append(species, 1),
+        "serialnum": 2,
+    }
+
+    with pytest.raises(ValueError):
+        TrajectorySet.from_arrays(np.array([1]), np.array([0, 2]), t, x, y, species)
+    with pytest.raises(ValueError):
+        TrajectorySet.from_arrays(np.array([1, 2]), np.array([0, 3, 3]), t, x, y, species)
+    with pytest.raises(TypeError):
+        TrajectorySet.from_arrays(np.array([1]), np.array([0, 3]), t, x, y, species * 0.5)
+
+
+def test_trajset_from_arrays_owns_data():
+    t, x, y, species = _get_arrays()
+    serialnums = np.array([1, 2])
+    offsets = np.array([0, 3, 6])
+    t_all = np.concatenate((t, t))
+    species_all = np.concatenate((species, species))
+    trajs = TrajectorySet.from_arrays(
+        serialnums, offsets, t_all, np.tile(x, 2), np.tile(y, 2), species_all
+    )
+    assert not trajs.has_duplicate_serialnums
+    serialnums[1] = 1
+    offsets[1] = 2
+    t_all[0] = 5
+    species_all[0] = 7
+    np.testing.assert_array_equal(trajs.serialnums, [1, 2])
+    np.testing.assert_array_equal(trajs.offsets, [0, 3, 6])
+    assert trajs.t[0] == t[0]
+    assert trajs.species[0] == species[0]
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64, np.float16])
+def test_adjust_for_periodic_boundaries(dtype):
+    position = np.array([1, 3, 0.5, 3.5, 2], dtype=dtype)
+    adjusted = Trajectory.adjust_for_periodic_boundaries(position, 0, 4)
+    np.testing.assert_allclose(adjusted, [1, 3, 4.5, 3.5, 2])
+    unmoved = np.array([1, 2, 1], dtype=dtype)
+    assert Trajectory.adjust_for_periodic_boundaries(unmoved, 0, 4) is unmoved
+    rows = np.array([[1, 3, 0.5], [3.5, 0.5, 1]], dtype=dtype)
+    adjusted = Trajectory.adjust_for_periodic_boundaries(rows, 0, 4)
+    np.testing.assert_allclose(adjusted, [[1, 3, 4.5], [3.5, 4.5, 5]])
+
+
+def test_trajset_species_dtype():
+    t, x, y, _ = _get_arrays()
+    trajs = TrajectorySet.from_list([Trajectory(1, t, x, y, np.array([0, 3, 200]))])
+    assert trajs.species.dtype == np.uint8
+    trajs = trajs + Trajectory(2, t, x, y, np.array([-1, 0, 1], dtype=np.int32))
+    assert trajs.species.dtype == np.int16
+    np.testing.assert_array_equal(trajs.species, [0, 3, 200, -1, 0, 1])
+
+
+def test_float32_construction():
+    t, x, y, species = _get_arrays()
+    traj = Trajectory.from_arrays(1, t.tolist(), x.tolist(), y.tolist(), species.tolist())
+    assert traj.x.dtype == np.float64
+    traj = Trajectory.from_arrays(1, t, x, y, species, dtype=np.float32)
+    assert traj.t.dtype == traj.x.dtype == traj.y.dtype == np.float32
+    trajs = TrajectorySet.from_list([Trajectory(1, t, x.astype(np.float64), y, species)])
+    assert trajs.x.dtype == np.float64
+    trajs = TrajectorySet.from_list(list(trajs), dtype=np.float32)
+    assert trajs.t.dtype == trajs.x.dtype == trajs.y.dtype == np.float32
+
+
+def test_trajset_repeated_add():
+    t, x, y, species = _get_arrays()
+    trajs = TrajectorySet.from_list([])
+    for n in range(20):
+        trajs = trajs + Trajectory(n, t, x, y, species)
+    assert trajs == TrajectorySet.from_list(trajs.trajectories)
+    assert list(trajs.serialnums) == list(range(20))
+    branch1 = trajs + Trajectory(20, t, x + 1, y, species)
+    branch2 = trajs + Trajectory(21, t, x, y, species.astype(np.int64) + 300)
+    assert len(trajs) == 20
+    assert branch1[-1] == Trajectory(20, t, x + 1, y, species)
+    assert branch2[-1] == Trajectory(21, t, x, y, species.astype(np.int64) + 300)
+    assert branch1.species.dtype == np.uint8
+    assert branch2.species.dtype == np.uint16
+    unpickled = pickle.loads(pickle.dumps(branch1))
+    assert unpickled == branch1
+    assert unpickled._storage is None
+    assert len(pickle.dumps(branch1)) <= len(pickle.dumps(TrajectorySet.from_list(branch1))) + 64
+
+
+def test_trajset_concurrent_add():
+    t, x, y, species = _get_arrays()
+    trajs = TrajectorySet.from_list([]) + Trajectory(0, t, x, y, species)
+    others = [Trajectory(n, t, x + n, y, species) for n in range(1, 65)]
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda other: trajs + other, others))
+    for other, result in zip(others, results):
+        assert result.trajectories == (trajs[0], other)
+
+
+def test_trajset_as_grid():
+    t, x, y, species = _get_arrays()
+    trajs = TrajectorySet.from_list([Trajectory(n, t, x + n, y, species) for n in range(2)])
+    assert trajs.is_fixed_grid
+    t_grid, x_grid, _, species_grid = trajs.as_grid()
+    assert x_grid.shape == (2, 3)
+    np.testing.assert_allclose(x_grid[1], x + 1)
+    np.testing.assert_array_equal(species_grid[0], species)
+    assert np.shares_memory(t_grid, trajs.t)
+    trajs = trajs + Trajectory(3, t[:2], x[:2], y[:2], species[:2])
+    assert not trajs.is_fixed_grid
+    with pytest.raises(ValueError):
+        trajs.as_grid()
@@ -1,9 +1,13 @@
+from collections import OrderedDict
+
 import numpy as np
 import pytest
 from scipy.optimize import OptimizeWarning
 
-from smoldynutils.data_objects import Trajectory
+from smoldynutils import metrics
+from smoldynutils.data_objects import Trajectory, TrajectorySet
 from smoldynutils.metrics import *
+from smoldynutils.utils import array_digest
 
 expected_x_displacement = 1
 expected_y_displacement = -1
@@ -45,6 +49,9 @@ def test_displacement(arrays):
     assert np.isclose(x_displ1, np.array([expected_x_displacement] * (len(x) - 1))).all()
     x_displ2 = calc_displacements(x, lag=2)
     assert np.isclose(x_displ2, np.array([2 * expected_x_displacement] * (len(x) - 2))).all()
+    out = np.empty(len(x) - 2)
+    assert calc_displacements(x, lag=2, out=out) is out
+    np.testing.assert_allclose(out, x_displ2)
     with pytest.raises(ValueError):
         calc_displacements(t, lag=4)
 
@@ -91,6 +98,10 @@ def test_displacement_from_zero(traj):
         )
         ** 2,
     ).all()
+    out = np.empty(len(traj.x))
+    assert calc_sq_displacement_from_zero(traj.x, out=out) is out
+    np.testing.assert_allclose(out, x_displ)
+    np.testing.assert_allclose(calc_sq_displacement_from_zero(np.array([1, 3])), [0, 4])
 
 
 def test_calc_combined_msd(traj, unmoving_traj):
@@ -100,26 +111,53 @@ def test_calc_combined_msd(traj, unmoving_traj):
     xy_displ = calc_xy_displacement(unmoving_traj)
     x_msd, y_msd = calc_xy_msd(xy_displ)
     np.testing.assert_allclose(calc_combined_msd((x_msd, y_msd)), np.array(0))
+    out = np.ones(3)
+    assert calc_combined_msd((out, np.arange(3)), out=out) is out
+    np.testing.assert_allclose(out, [1, 2, 3])
 
 
 def test_estimate_diffcoff(traj, unmoving_traj):
     xy_disp = calc_xy_displacement(unmoving_traj)
     x_msd, y_msd = calc_xy_msd(xy_disp)
     msd = calc_combined_msd((x_msd, y_msd))
-    with pytest.warns(OptimizeWarning):
-        d = estimate_diffcoff(msd, np.array([1]))
-        np.testing.assert_almost_equal(d, 0)
+    d = estimate_diffcoff(msd, np.array([1]))
+    np.testing.assert_almost_equal(d, 0)
     xy_disp = calc_xy_displacement(traj)
     msds = calc_xy_msd(xy_disp)
     msd = calc_combined_msd(msds)
-    with pytest.warns(OptimizeWarning):
-        np.testing.assert_almost_equal(estimate_diffcoff(msd, np.array([1])), expected_D)
+    np.testing.assert_almost_equal(estimate_diffcoff(msd, np.array([1])), expected_D)
     with pytest.warns(UserWarning):
         estimate_diffcoff(msd, np.array([1]), add_epsilon=True)
 
     np.testing.assert_equal(
         estimate_diffcoff(np.array([0, 1, 2]), np.array([1, 2, 3]), add_epsilon=True), 0.25
     )
+    msds = np.array([2.1, 3.9, 6.2, 7.8])
+    timepoints = np.array([1, 2, 3, 4])
+    for add_epsilon in (False, True):
+        popt, _ = estimate_diffcoff_fullinfo(msds, timepoints, add_epsilon=add_epsilon)
+        np.testing.assert_almost_equal(
+            estimate_diffcoff(msds, timepoints, add_epsilon=add_epsilon), popt[0]
+        )
+
+
+def test_estimate_diffcoffs():
+    timepoints = np.array([1, 2, 3, 4])
+    msds = np.array([[2.1, 3.9, 6.2, 7.8], [0.0, 1.0, 2.0, 3.0], [4.0, 8.0, 12.0, 16.0]])
+    for add_epsilon in (False, True):
+        expected = [estimate_diffcoff(msd, timepoints, add_epsilon=add_epsilon) for msd in msds]
+        np.testing.assert_allclose(
+            estimate_diffcoffs(msds, timepoints, add_epsilon=add_epsilon), expected
+        )
+        np.testing.assert_allclose(
+            estimate_diffcoffs(msds, np.tile(timepoints, (3, 1)), add_epsilon=add_epsilon),
+            expected,
+        )
+    with pytest.warns(UserWarning):
+        estimate_diffcoffs(msds[:, :1], timepoints[:1], add_epsilon=True)
+    msds_32 = msds.astype(np.float32)
+    assert estimate_diffcoffs(msds_32, timepoints.astype(np.float32)).dtype == np.float32
+    assert estimate_diffcoffs(msds_32, timepoints).dtype == np.float64
 
 
 def test_estimate_diffcoff_full_return():
@@ -127,3 +165,53 @@ def test_estimate_diffcoff_full_return():
     with pytest.warns(OptimizeWarning):
         full_d = estimate_diffcoff_fullinfo(msd, np.array([1]))
         assert len(full_d) == 2
+
+
+def test_calc_msd_curve(traj, unmoving_traj):
+    trajs = TrajectorySet.from_list([traj, unmoving_traj, traj])
+    msd_curve = calc_msd_curve(trajs, [1, 2])
+    np.testing.assert_allclose(msd_curve, [2 / 3 * expected_msd, 2 / 3 * 4 * expected_msd])
+    with pytest.raises(ValueError):
+        calc_msd_curve(trajs, [3])
+
+
+def test_calc_msd_per_trajectory(traj, unmoving_traj):
+    trajs = TrajectorySet.from_list([traj, unmoving_traj])
+    np.testing.assert_allclose(calc_msd_per_trajectory(trajs, 2), [4 * expected_msd, 0])
+    traj16 = Trajectory(1, traj.t, traj.x.astype(np.float16), traj.y, traj.species)
+    trajs16 = TrajectorySet.from_list([unmoving_traj, traj16])
+    np.testing.assert_allclose(calc_msd_per_trajectory(trajs16), [0, expected_msd], rtol=1e-3)
+    assert len(calc_msd_per_trajectory(TrajectorySet.from_list([]))) == 0
+    with pytest.raises(ValueError):
+        calc_msd_per_trajectory(trajs, 3)
+
+
+def test_calc_msd_curve_fallback(traj):
+    traj16 = Trajectory(
+        1, traj.t, traj.x.astype(np.float16), traj.y.astype(np.float16), traj.species
+    )
+    trajs = TrajectorySet.from_list([traj16, traj16])
+    np.testing.assert_allclose(calc_msd_curve(trajs, [1, 2]), [expected_msd, 4 * expected_msd])
+
+
+def test_estimate_diffcoff_fullinfo_cache():
+    msds = np.array([2.1, 3.9, 6.2, 7.8])
+    timepoints = np.array([1, 2, 3, 4])
+    popt, pcov = estimate_diffcoff_fullinfo(msds, timepoints)
+    popt[0] = -1
+    cached_popt, cached_pcov = estimate_diffcoff_fullinfo(msds.copy(), timepoints.copy())
+    assert cached_popt[0] > 0
+    np.testing.assert_array_equal(cached_pcov, pcov)
+    for _ in range(2):
+        with pytest.warns(OptimizeWarning):
+            estimate_diffcoff_fullinfo(np.array([1.0]), np.array([2.0]))
+
+
+def test_estimate_diffcoff_fullinfo_cache_lru(monkeypatch):
+    monkeypatch.setattr(metrics, "FIT_CACHE_SIZE", 2)
+    monkeypatch.setattr(metrics, "_fit_cache", OrderedDict())
+    timepoints = np.array([1, 2, 3])
+    msds = [np.array([4.1, 7.9, 12.2]) * n for n in (1, 2, 3)]
+    for index in (0, 1, 0, 2):
+        estimate_diffcoff_fullinfo(msds[index], timepoints)
+    assert [key[0] for key in metrics._fit_cache] == [array_digest(msds[0]), array_digest(msds[2])]
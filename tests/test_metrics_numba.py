@@ -0,0 +1,70 @@
+import numpy as np
+
+from smoldynutils.metrics_numba import *
+
+
+def test_supports_dtypes():
+    assert supports_dtypes(np.zeros(2, dtype=np.float32), np.zeros(2, dtype=np.int64))
+    assert not supports_dtypes(np.zeros(2), np.zeros(2, dtype=np.float16))
+
+
+def test_msd_all():
+    x = np.array([0, 1, 2, 3, 0, 0, 0], dtype=np.float64)
+    y = np.array([0, -1, -2, -3, 1, 1, 1], dtype=np.float64)
+    offsets = np.array([0, 4, 7])
+    xy = np.column_stack((x, y))
+    out = np.empty(2)
+    msd_all(xy, offsets, 1, out)
+    np.testing.assert_allclose(out, [2, 0])
+    msd_all(xy, offsets, 2, out)
+    np.testing.assert_allclose(out, [8, 0])
+
+
+def test_sq_displacement_from_start():
+    x = np.array([0, 1, 2, 5, 6], dtype=np.float32)
+    y = np.array([1, 1, 3, 0, 0], dtype=np.float32)
+    out = np.empty(5, dtype=np.float32)
+    sq_displacement_from_start(x, y, np.array([0, 3, 5]), out)
+    np.testing.assert_allclose(out, [0, 1, 8, 0, 1])
+
+
+def test_msd_all_lags():
+    x = np.array([0, 1, 2, 3, 0, 0, 0], dtype=np.float64)
+    y = np.array([0, -1, -2, -3, 1, 1, 1], dtype=np.float64)
+    offsets = np.array([0, 4, 7])
+    out = np.empty((2, 2))
+    msd_all_lags(np.column_stack((x, y)), offsets, np.array([2, 1]), out)
+    np.testing.assert_allclose(out, [[8, 2], [0, 0]])
+
+
+def test_unwrap_periodic():
+    position = np.array([3.5, 0.5, 3.5, 3.0])
+    out = np.empty(4)
+    assert unwrap_periodic(position, 4.0, out)
+    np.testing.assert_allclose(out, [3.5, 4.5, 3.5, 3.0])
+    assert not unwrap_periodic(np.array([1.0, 2.0]), 4.0, out[:2])
+
+
+def test_unwrap_periodic_rows():
+    position = np.array([[3.5, 0.5], [1.0, 2.0]])
+    out = np.empty((2, 2))
+    assert unwrap_periodic_rows(position, 4.0, out)
+    np.testing.assert_allclose(out, [[3.5, 4.5], [1.0, 2.0]])
+
+
+def test_has_jumps():
+    assert has_jumps(np.array([1.0, 1.1, -1.0]), 0.5)
+    assert not has_jumps(np.array([1.0, 1.1, 1.2]), 0.5)
+    assert not has_jumps(np.array([1, 2, 3], dtype=np.int32), 0.5)
+    assert not has_jumps(np.array([1.0, np.nan, -1.0]), 0.5)
+
+
+def test_gauss_pdf():
+    assert np.isclose(gauss_pdf(0.0, 0.0, 1.0), 1 / np.sqrt(2 * np.pi))
+    assert np.isclose(gauss_pdf(3.0, 1.0, 2.0), np.exp(-0.5) / (np.sqrt(2 * np.pi) * 2))
+    assert np.isclose(brownian_pdf(0.5, 2.0, 3.0), gauss_pdf(0.5, 0.0, np.sqrt(12.0)))
+
+
+def test_min_max_mean():
+    assert min_max_mean(np.array([0, 0, 0, 1, -1])) == (-1, 1, 0)
+    assert min_max_mean(np.array([2.5], dtype=np.float32)) == (2.5, 2.5, 2.5)
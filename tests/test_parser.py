@@ -90,3 +90,41 @@ def test_fixed_grid_parser(tmp_path):
         "y": np.array([2.06726, 2.10000, 2.10000]),
         "species": np.array([1, 1, 1]),
     }
+
+
+def test_fixed_grid_parser_pyarrow(tmp_path):
+    pytest.importorskip("pyarrow")
+    path = _write_sample(tmp_path)
+    ts = SmoldynParser(str(path), engine="pyarrow").parse_fixed_grid()
+    assert ts == SmoldynParser(str(path)).parse_fixed_grid()
+
+
+def test_sort_order():
+    t = np.array([2.0, 1.0, 1.5, 1.0, 2.0])
+    serial_number = np.array([7, 7, 3, 3, 3], dtype=np.uint32)
+    expected = np.lexsort((t, serial_number))
+    np.testing.assert_array_equal(SmoldynParser("", dt=0.5)._sort_order(t, serial_number), expected)
+    np.testing.assert_array_equal(SmoldynParser("", dt=0.4)._sort_order(t, serial_number), expected)
+    serial_number = serial_number.astype(np.uint64) << np.uint64(20)
+    expected = np.lexsort((t, serial_number))
+    np.testing.assert_array_equal(SmoldynParser("", dt=0.5)._sort_order(t, serial_number), expected)
+    t = np.array([1.0004, 1.0, 0.5])
+    serial_number = np.array([3, 3, 3], dtype=np.uint32)
+    np.testing.assert_array_equal(
+        SmoldynParser("", dt=0.5)._sort_order(t, serial_number), [2, 1, 0]
+    )
+    t = np.array([1.0, np.nan, 0.5])
+    expected = np.lexsort((t, serial_number))
+    np.testing.assert_array_equal(SmoldynParser("", dt=0.5)._sort_order(t, serial_number), expected)
+
+
+def test_grid_serials():
+    serial_ids, expected = SmoldynParser._grid_serials(np.array([3, 3, 5, 5, 8, 8]))
+    np.testing.assert_array_equal(serial_ids, [3, 5, 8])
+    assert expected == 2
+    serial_ids, expected = SmoldynParser._grid_serials(np.array([4, 4, 4]))
+    np.testing.assert_array_equal(serial_ids, [4])
+    assert expected == 3
+    for serial_number in ([1, 2, 2], [1, 1, 2], [1, 1, 2, 3]):
+        with pytest.raises(NotImplementedError):
+            SmoldynParser._grid_serials(np.array(serial_number))
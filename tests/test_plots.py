@@ -19,7 +19,9 @@ def test_plot_gauss_comparison(plot):
     initial_patches = len(ax.patches)
     returned = plot_gauss_comparison(disp, gauss, ax, title="Testtitle")
     assert returned is ax
-    assert len(returned.patches) > initial_patches
+    assert len(returned.patches) == initial_patches + 2
+    edges = [patch.get_data().edges for patch in returned.patches]
+    np.testing.assert_array_equal(edges[0], edges[1])
     assert returned.get_title() == "Testtitle"
 
 
@@ -36,10 +38,15 @@ def test_plot_trajectorie(plot):
     assert len(returned.collections) > initial_dots
     assert returned.get_title() == "test"
 
+    fig, ax = plt.subplots()
+    returned = plot_trajectorie(traj, ax, "test", scatter=False)
+    assert len(returned.lines) == 0
+    assert len(returned.collections) == 1
+    assert returned.collections[0].get_segments()[0].tolist() == [[0, 0], [1, 1]]
+
 
 def test_plot_trajectories(plot):
     fig, ax = plot
-    initial_lines = len(ax.patches)
     initial_dots = len(ax.collections)
     vals = np.linspace(0, 10, 11)
     species = np.array([1] * 11)
@@ -47,8 +54,8 @@ def test_plot_trajectories(plot):
     trajset = TrajectorySet.from_list([traj] * 5)
     returned = plot_trajectories(trajset, ax, "test")
     assert returned is ax
-    assert len(returned.lines) > initial_lines
-    assert len(returned.collections) > initial_dots
+    assert len(returned.collections) == initial_dots + 2
+    assert len(returned.collections[initial_dots].get_segments()) == 5 * 10
     assert returned.get_title() == "test"
 
 
@@ -15,7 +15,7 @@ def test_gaussian_probability():
     )
 
 
-@pytest.mark.parametrize("sigma", [0, -1])
+@pytest.mark.parametrize("sigma", [0, -1, np.nan])
 def test_gaussian_raises_error(sigma):
     with pytest.raises(ValueError):
         gauss_probability_density(0, 0, sigma=sigma)
@@ -33,7 +33,7 @@ def test_theoretical_brownian_motion():
     )
 
 
-@pytest.mark.parametrize("D, t", [(-1, 1), (1, -1), (1, 0)])
+@pytest.mark.parametrize("D, t", [(-1, 1), (1, -1), (1, 0), (np.nan, 1), (1, np.nan)])
 def test_brownian_error(D, t):
     with pytest.raises(ValueError):
         theoretical_brownian_motion_pdf(0, D, t)
@@ -45,3 +45,12 @@ def test_theoretical_msds():
 
     assert theoretical_msd_residue(0, 0, 0) == 0
     assert theoretical_msd_residue(1, 1, 1) == 5
+
+
+def test_gaussian_probability_array():
+    x = np.array([-1.0, 0.0, 2.5])
+    expected = [gauss_probability_density(float(value), 0.5, 2) for value in x]
+    np.testing.assert_allclose(gauss_probability_density(x, 0.5, 2), expected)
+    np.testing.assert_allclose(
+        theoretical_brownian_motion_pdf(x, 2, 3), gauss_probability_density(x, 0, np.sqrt(12))
+    )
@@ -2,12 +2,16 @@ import numpy.testing as npt
 import pytest
 
 from smoldynutils.data_objects import TrajectorySet
+from smoldynutils.metrics import estimate_diffcoff
 from smoldynutils.workflows import *
 
 expected_d = 0.5
+n_trajs = 3
+# MSD(tau) = 4 * D * tau
+expected_msd_tau = {1: 2.0, 2: 4.0, 3: 6.0}
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def tau_traj():
     # Finding an artificial trajectory that produces an exact D using tau method
     # is not trivial.
@@ -33,7 +37,7 @@ def tau_traj():
     return Trajectory(1, x=x, y=y, t=t, species=species)
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def time_traj():
     # Finding an artificial trajectory that produces an exact D using t is more
     # straightforward.
@@ -55,25 +59,39 @@ def time_traj():
     return Trajectory(1, x=x, y=y, t=t, species=species)
 
 
+@pytest.fixture(scope="module")
+def tau_trajset(tau_traj):
+    return TrajectorySet.from_list([tau_traj] * n_trajs)
+
+
+@pytest.fixture(scope="module")
+def time_trajset(time_traj):
+    return TrajectorySet.from_list([time_traj] * n_trajs)
+
+
 @pytest.mark.filterwarnings(r"ignore: Large jumps in trajectory.*:UserWarning")
 def test_estimate_timelag_msd(tau_traj):
-    lags = [1, 2, 3]
-    expected_msd = {lag: 4 * expected_d * lag for lag in lags}
+    lags = list(expected_msd_tau)
     estimated_msd = estimate_timelag_msd_from_traj(tau_traj, lags)
     for lag in lags:
-        npt.assert_almost_equal(estimated_msd[lag], expected_msd[lag])
+        npt.assert_almost_equal(estimated_msd[lag], expected_msd_tau[lag])
 
 
 @pytest.mark.filterwarnings(r"ignore: Large jumps in trajectory.*:UserWarning")
-def test_estimate_timelag_diffcoff(tau_traj):
+def test_estimate_timelag_diffcoff(tau_traj, tau_trajset):
     lags = [1, 2, 3]
-    n_trajs = 3
-    trajset = TrajectorySet.from_list([tau_traj] * n_trajs)
-    estimated_ds = estimate_timelag_diffcoff_from_trajset(trajset, lags)
+    estimated_ds = estimate_timelag_diffcoff_from_trajset(tau_trajset, lags)
     summed_ds = np.sum(list(estimated_ds.values()))
     npt.assert_almost_equal(summed_ds, n_trajs * expected_d)
     npt.assert_array_equal(np.array(list(estimated_ds.keys())), np.arange(0, n_trajs))
 
+    trajset_32 = TrajectorySet.from_list([tau_traj] * n_trajs, dtype=np.float32)
+    npt.assert_allclose(
+        estimate_timelag_diffcoff_from_trajset(trajset_32, lags, as_array=True),
+        [expected_d] * n_trajs,
+        rtol=1e-5,
+    )
+
     serialnums = [1, 2, 3, 99]
     trajs = [
         Trajectory(serialnum, t=tau_traj.t, x=tau_traj.x, y=tau_traj.y, species=tau_traj.species)
@@ -82,21 +100,30 @@ def test_estimate_timelag_diffcoff(tau_traj):
     trajset = TrajectorySet.from_list(trajs)
     estimated_ds = estimate_timelag_diffcoff_from_trajset(trajset, lags)
     npt.assert_array_equal(np.array(list(estimated_ds.keys())), serialnums)
+    npt.assert_array_equal(
+        estimate_timelag_diffcoff_from_trajset(trajset, lags, as_array=True),
+        list(estimated_ds.values()),
+    )
 
 
 @pytest.mark.filterwarnings(r"ignore: Large jumps in trajectory.*:UserWarning")
 def test_estimate_time_msd(time_traj):
-    expected_msd = [4 * expected_d * t for t in time_traj.t]
+    expected_msd = 4 * expected_d * np.asarray(time_traj.t)
     estimated_msd = estimate_time_msd_from_traj(time_traj)
-    for t in time_traj.t:
-        npt.assert_almost_equal(estimated_msd, expected_msd)
+    npt.assert_almost_equal(estimated_msd, expected_msd)
+    estimated_msd *= 2
+    npt.assert_almost_equal(estimate_time_msd_from_traj(time_traj), expected_msd)
+    x = np.array(time_traj.x)
+    traj = Trajectory(1, time_traj.t, x, time_traj.y, time_traj.species)
+    estimated_msd = estimate_time_msd_from_traj(traj)
+    x[2] = 1.0
+    npt.assert_array_equal(traj.x, time_traj.x)
+    npt.assert_array_equal(estimate_time_msd_from_traj(traj), estimated_msd)
 
 
 @pytest.mark.filterwarnings(r"ignore: Large jumps in trajectory.*:UserWarning")
-def test_estimate_time_diffcoff(time_traj):
-    n_trajs = 3
-    trajset = TrajectorySet.from_list([time_traj] * n_trajs)
-    estimated_ds = estimate_time_diffcoff_from_trajset(trajset)
+def test_estimate_time_diffcoff(time_traj, time_trajset):
+    estimated_ds = estimate_time_diffcoff_from_trajset(time_trajset)
     summed_ds = np.sum(list(estimated_ds.values()))
     npt.assert_almost_equal(summed_ds, n_trajs * expected_d)
     npt.assert_array_equal(np.array(list(estimated_ds.keys())), np.arange(0, n_trajs))
@@ -109,3 +136,127 @@ def test_estimate_time_diffcoff(time_traj):
     trajset = TrajectorySet.from_list(trajs)
     estimated_ds = estimate_time_diffcoff_from_trajset(trajset)
     npt.assert_array_equal(np.array(list(estimated_ds.keys())), serialnums)
+    npt.assert_array_equal(
+        estimate_time_diffcoff_from_trajset(trajset, as_array=True), list(estimated_ds.values())
+    )
+
+
+@pytest.mark.filterwarnings(r"ignore: Large jumps in trajectory.*:UserWarning")
+def test_estimate_time_diffcoff_ragged(time_traj):
+    short_traj = Trajectory(
+        2, time_traj.t[:3], time_traj.x[:3], time_traj.y[:3], time_traj.species[:3]
+    )
+    trajset = TrajectorySet.from_list([time_traj, short_traj])
+    assert not trajset.is_fixed_grid
+    estimated_ds = estimate_time_diffcoff_from_trajset(trajset)
+    npt.assert_almost_equal(list(estimated_ds.values()), [expected_d, expected_d])
+
+    trajset_32 = TrajectorySet.from_list([time_traj, short_traj], dtype=np.float32)
+    estimated_ds = estimate_time_diffcoff_from_trajset(trajset_32)
+    npt.assert_allclose(list(estimated_ds.values()), [expected_d, expected_d], rtol=1e-5)
+    npt.assert_array_equal(
+        estimate_time_diffcoff_from_trajset(trajset_32, as_array=True), list(estimated_ds.values())
+    )
+
+
+@pytest.mark.filterwarnings(r"ignore: Large jumps in trajectory.*:UserWarning")
+def test_estimate_timelag_msd_matches_per_lag(tau_traj):
+    lags = (3, 1, 2)
+    estimated_msd = estimate_timelag_msd_from_traj(tau_traj, lags)
+    assert list(estimated_msd) == list(lags)
+    for lag in lags:
+        dx = tau_traj.x[lag:] - tau_traj.x[:-lag]
+        dy = tau_traj.y[lag:] - tau_traj.y[:-lag]
+        npt.assert_almost_equal(estimated_msd[lag], np.mean(dx**2 + dy**2))
+    assert estimate_timelag_msd_from_traj(tau_traj, ()) == {}
+    npt.assert_array_equal(
+        estimate_timelag_msd_from_traj_array(tau_traj, lags), list(estimated_msd.values())
+    )
+    traj_16 = Trajectory(
+        1,
+        tau_traj.t,
+        tau_traj.x.astype(np.float16),
+        tau_traj.y.astype(np.float16),
+        tau_traj.species,
+    )
+    npt.assert_allclose(
+        estimate_timelag_msd_from_traj_array(traj_16, lags),
+        list(estimated_msd.values()),
+        rtol=1e-2,
+    )
+    with pytest.raises(ValueError, match="Timelag is bigger"):
+        estimate_timelag_msd_from_traj(tau_traj, (1, 4))
+    with pytest.raises(ValueError, match="Timelags must be positive"):
+        estimate_timelag_msd_from_traj(tau_traj, (0, 1))
+
+
+@pytest.mark.filterwarnings(r"ignore: Large jumps in trajectory.*:UserWarning")
+def test_estimate_timelag_diffcoff_ragged(tau_traj, time_traj):
+    lags = [1, 2]
+    short_traj = Trajectory(
+        2, time_traj.t[:3], time_traj.x[:3], time_traj.y[:3], time_traj.species[:3]
+    )
+    trajset = TrajectorySet.from_list([tau_traj, short_traj])
+    estimated_ds = estimate_timelag_diffcoff_from_trajset(trajset, lags)
+    for traj, estimated_d in zip(trajset, estimated_ds.values()):
+        msds = list(estimate_timelag_msd_from_traj(traj, lags).values())
+        npt.assert_almost_equal(estimated_d, estimate_diffcoff(np.array(msds), np.array(lags)))
+    with pytest.raises(ValueError, match="Timelag is bigger"):
+        estimate_timelag_diffcoff_from_trajset(trajset, [1, 3])
+    with pytest.raises(ValueError, match="Timelags must be positive"):
+        estimate_timelag_diffcoff_from_trajset(trajset, [0, 1])
+
+
+@pytest.mark.filterwarnings(r"ignore: Large jumps in trajectory.*:UserWarning")
+def test_estimate_timelag_msd_fft():
+    rng = np.random.default_rng(0)
+    n = 100
+    x = np.cumsum(rng.normal(size=n)) + 100
+    y = np.cumsum(rng.normal(size=n))
+    traj = Trajectory(1, np.arange(n, dtype=np.float32), x, y, np.zeros(n, dtype=np.uint8))
+    lags = range(1, n)
+    assert len(lags) >= FFT_MIN_TIMELAGS
+    estimated_msd = estimate_timelag_msd_from_traj(traj, lags)
+    for lag in lags:
+        expected = np.mean((x[lag:] - x[:-lag]) ** 2 + (y[lag:] - y[:-lag]) ** 2)
+        npt.assert_allclose(estimated_msd[lag], expected, rtol=1e-10)
+    npt.assert_allclose(calc_msd_fft(traj)[0], 0, atol=1e-10)
+    for lags in ((1, 2, 3), range(1, n)):
+        npt.assert_allclose(
+            estimate_timelag_msd_from_traj_array(traj, lags, method="fft"),
+            estimate_timelag_msd_from_traj_array(traj, lags, method="direct"),
+            rtol=1e-10,
+        )
+    with pytest.raises(ValueError, match="Unknown method"):
+        estimate_timelag_msd_from_traj(traj, lags, method="exact")
+
+
+def test_estimate_time_diffcoff_float16_large_displacements():
+    t = np.arange(5, dtype=np.float32)
+    species = np.zeros(5, dtype=np.uint8)
+    trajs = [Trajectory(n, t, 300 * t + n, np.zeros(5), species) for n in range(2)]
+    estimated_ds = estimate_time_diffcoff_from_trajset(
+        TrajectorySet.from_list(trajs, dtype=np.float16), as_array=True
+    )
+    expected_ds = estimate_time_diffcoff_from_trajset(TrajectorySet.from_list(trajs), as_array=True)
+    npt.assert_allclose(estimated_ds, expected_ds, rtol=1e-2)
+
+
+@pytest.mark.filterwarnings(r"ignore: Large jumps in trajectory.*:UserWarning")
+def test_estimate_time_diffcoff_ragged_float16(time_traj):
+    short_traj = Trajectory(
+        2, time_traj.t[:3], time_traj.x[:3], time_traj.y[:3], time_traj.species[:3]
+    )
+    trajset = TrajectorySet.from_list([time_traj, short_traj], dtype=np.float16)
+    estimated_ds = estimate_time_diffcoff_from_trajset(trajset, as_array=True)
+    npt.assert_allclose(estimated_ds, [expected_d, expected_d], rtol=1e-2)
+    t = np.arange(5, dtype=np.float32)
+    species = np.zeros(5, dtype=np.uint8)
+    trajs = [Trajectory(n, t[: 5 - n], 300 * t[: 5 - n], t[: 5 - n], species[n:]) for n in range(2)]
+    npt.assert_allclose(
+        estimate_time_diffcoff_from_trajset(
+            TrajectorySet.from_list(trajs, dtype=np.float16), as_array=True
+        ),
+        estimate_time_diffcoff_from_trajset(TrajectorySet.from_list(trajs), as_array=True),
+        rtol=1e-2,
+    )